@@ -0,0 +1,145 @@
+"""
+Quantity-aware availability for Holy Mole.
+Computes how many more portions of every menu item can be sold from current stock,
+walking the recipe graph bottom-up in topological order. Results are cached per graph
+revision and only the ancestors of a changed ingredient are recomputed.
+"""
+import math
+import threading
+from array import array
+from typing import Any
+
+from logic import CompiledGraph, GraphCache
+
+
+class AvailabilityEngine:
+    """Sellable portions per menu item for one compiled graph.
+
+    `available[n]` is how many units of node n can be served: its own stock plus what
+    can be prepared from its children (sub-recipes). `limiting[n]` is the stocked node
+    that runs out first along n's cheapest path.
+    """
+
+    def __init__(self, graph: CompiledGraph):
+        self.graph = graph
+        n = len(graph.names)
+        self._lock = threading.Lock()
+
+        # Forward adjacency (parent -> children with per-portion quantities), the
+        # transpose of the graph's reverse CSR.
+        children: list[list[tuple[int, float]]] = [[] for _ in range(n)]
+        for child in range(n):
+            for i in range(graph.rev_offsets[child], graph.rev_offsets[child + 1]):
+                children[graph.rev_targets[i]].append((child, graph.rev_quantities[i]))
+        self.children = children
+
+        # Topological order with children before parents (Kahn over the reverse edges).
+        pending = [len(c) for c in children]
+        order = [nid for nid in range(n) if pending[nid] == 0]
+        for nid in order:
+            for dep in graph.dependents(nid):
+                pending[dep] -= 1
+                if pending[dep] == 0:
+                    order.append(dep)
+        if len(order) != n:
+            raise ValueError("Recipe graph contains a cycle")
+        self.order = order
+        self.position = array("l", [0]) * n
+        for pos, nid in enumerate(order):
+            self.position[nid] = pos
+
+        self.stock = array("d", [0.0]) * n
+        self.available = array("d", [0.0]) * n
+        self.limiting = array("l", range(n))
+        self._recompute(order)
+
+    def _evaluate(self, nid: int) -> None:
+        stock = self.stock[nid]
+        kids = self.children[nid]
+        if not kids:
+            self.available[nid] = stock
+            self.limiting[nid] = nid
+            return
+        made = math.inf
+        limit = nid
+        for child, qty in kids:
+            ratio = self.available[child] / qty if qty > 0 else math.inf
+            if ratio < made:
+                made = ratio
+                limit = self.limiting[child]
+        if made == math.inf:
+            made = 0.0
+        self.available[nid] = stock + made
+        self.limiting[nid] = nid if stock > 0 else limit
+
+    def _recompute(self, nodes) -> None:
+        for nid in nodes:
+            self._evaluate(nid)
+
+    def set_quantity(self, name: str, quantity: float) -> bool:
+        """Update one node's stock and recompute only the nodes it feeds. Returns False if unknown."""
+        nid = self.graph.resolve(name)
+        if nid is None:
+            return False
+        with self._lock:
+            if self.stock[nid] == quantity:
+                return True
+            self.stock[nid] = quantity
+            self._recompute(sorted(self.graph.reach(nid), key=self.position.__getitem__))
+        return True
+
+    def sync(self, quantities: dict[str, float]) -> int:
+        """
+        Bring stock in line with `quantities` (name -> on-hand). Nodes missing from the
+        mapping are treated as out of stock. Returns the number of nodes that changed.
+        """
+        graph = self.graph
+        target = array("d", [0.0]) * len(graph.names)
+        for name, qty in quantities.items():
+            nid = graph.resolve(name)
+            if nid is not None:
+                target[nid] += max(0.0, qty)
+        with self._lock:
+            changed = [nid for nid in range(len(target)) if target[nid] != self.stock[nid]]
+            if not changed:
+                return 0
+            self.stock = target
+            if len(changed) == 1:
+                dirty = graph.reach(changed[0])
+            else:
+                marks = bytearray(len(target))
+                for nid in changed:
+                    for node in graph.reach(nid):
+                        marks[node] = 1
+                dirty = [nid for nid in range(len(target)) if marks[nid]]
+            self._recompute(sorted(dirty, key=self.position.__getitem__))
+        return len(changed)
+
+    def menu_availability(self) -> list[dict[str, Any]]:
+        """Portions remaining and limiting ingredient per menu item, fewest portions first."""
+        graph = self.graph
+        with self._lock:
+            rows = [
+                {
+                    "menu_item": graph.names[nid],
+                    "portions_remaining": int(math.floor(self.available[nid] + 1e-9)),
+                    "limiting_ingredient": graph.names[self.limiting[nid]],
+                    "revenue_per_hour": graph.revenue[nid],
+                }
+                for nid, kind in enumerate(graph.kinds)
+                if kind == "menu_item"
+            ]
+        rows.sort(key=lambda r: (r["portions_remaining"], -r["revenue_per_hour"]))
+        return rows
+
+
+_engines: GraphCache[AvailabilityEngine] = GraphCache(AvailabilityEngine)
+
+
+def get_availability_engine(graph: CompiledGraph) -> AvailabilityEngine:
+    """Return the availability engine for the given compiled graph."""
+    return _engines.get(graph)
+
+
+def discard_availability_engine(graph: CompiledGraph) -> None:
+    _engines.discard(graph)
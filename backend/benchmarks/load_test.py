@@ -0,0 +1,86 @@
+"""
+Mixed read/write load benchmark for a running Holy Mole API.
+
+    uvicorn main:app --port 8000 --workers 1
+    python benchmarks/load_test.py --url http://localhost:8000 --concurrency 64 --requests 4000
+
+Reads hit GET /inventory; writes alternate between POST /simulate-rush and
+POST /restock/{name}. Prints throughput and p50/p99 latency per request kind.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import httpx
+
+RESTOCK_NAMES = ["Avocados", "Lime", "Eggs", "Tortilla", "Cheese", "Salsa", "Chicken", "Steak"]
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+async def run(url: str, concurrency: int, total: int, write_ratio: float, seed: int) -> None:
+    rng = random.Random(seed)
+    plan = ["write" if rng.random() < write_ratio else "read" for _ in range(total)]
+    latencies: dict[str, list[float]] = {"read": [], "write": []}
+    errors = 0
+    next_index = 0
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30.0) as client:
+        await client.post("/seed")
+
+        async def worker() -> None:
+            nonlocal next_index, errors
+            while next_index < total:
+                i = next_index
+                next_index += 1
+                kind = plan[i]
+                start = time.perf_counter()
+                if kind == "read":
+                    resp = await client.get("/inventory")
+                elif i % 2:
+                    resp = await client.post("/simulate-rush")
+                else:
+                    resp = await client.post(f"/restock/{rng.choice(RESTOCK_NAMES)}")
+                latencies[kind].append((time.perf_counter() - start) * 1000)
+                if resp.status_code >= 400:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    print(f"{total} requests, concurrency {concurrency}, write ratio {write_ratio:.0%}")
+    print(f"elapsed {elapsed:.2f}s, {total / elapsed:.1f} req/s, errors {errors}")
+    for kind, samples in latencies.items():
+        if not samples:
+            continue
+        print(
+            f"  {kind:<5} n={len(samples):<6} "
+            f"p50={percentile(samples, 50):7.2f}ms "
+            f"p99={percentile(samples, 99):7.2f}ms "
+            f"mean={statistics.fmean(samples):7.2f}ms"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.concurrency, args.requests, args.write_ratio, args.seed))
+
+
+if __name__ == "__main__":
+    main()
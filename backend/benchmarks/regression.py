@@ -0,0 +1,213 @@
+"""
+Benchmark suite with stored baselines and regression gates.
+
+    python benchmarks/regression.py                          # 1k and 10k nodes vs baselines.json
+    python benchmarks/regression.py --sizes 1000 10000 100000
+    python benchmarks/regression.py --update                 # record new baselines
+
+Every case runs against a synthetic menu (see synthetic.py) loaded into a throwaway
+database: graph compilation and calculate_blast_radius are called directly, the
+endpoints (/blast-radius full and pruned, /inventory, /seed, /restock, /simulate-rush,
+/stock-movements) go through the FastAPI TestClient with the response cache cleared so
+the real work is timed. Results are compared with the stored baseline and the script
+exits 1 when throughput drops, or median latency rises, by more than --threshold.
+Baselines are machine specific; record them on the machine that runs the gate.
+"""
+import argparse
+import gc
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.dirname(HERE))
+
+DEFAULT_BASELINE = os.path.join(HERE, "baselines.json")
+DEFAULT_SIZES = (1_000, 10_000)
+DEFAULT_THRESHOLD = 0.25
+SALES_PER_BATCH = 1_000
+# What the frontend graph asks for: top menu items by revenue, the rest collapsed by category.
+PRUNED_QUERY = "top_k=12&group_by=category&format=compact"
+
+
+# Each timed sample runs the case enough times to take at least this long, so
+# microsecond-scale calls are not lost in timer and scheduler noise.
+MIN_SAMPLE_SECONDS = 0.002
+
+
+def measure(fn: Callable[[], object], min_time: float, max_samples: int, min_samples: int = 10) -> dict:
+    """
+    Time `fn` timeit-style: calibrate calls per sample, then collect samples with the
+    garbage collector paused. Throughput is calls over total time; latency percentiles
+    are per call within a sample.
+    """
+    fn()
+    number = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if time.perf_counter() - t0 >= MIN_SAMPLE_SECONDS or number >= 1 << 16:
+            break
+        number *= 4
+    samples = []
+    started = time.perf_counter()
+    gc.collect()
+    gc.disable()
+    try:
+        while len(samples) < max_samples and (
+            len(samples) < min_samples or time.perf_counter() - started < min_time
+        ):
+            t0 = time.perf_counter()
+            for _ in range(number):
+                fn()
+            samples.append((time.perf_counter() - t0) / number)
+    finally:
+        gc.enable()
+    ordered = sorted(samples)
+    median = statistics.median(ordered)
+    return {
+        "samples": len(samples),
+        "calls_per_sample": number,
+        "ops_per_sec": round(len(samples) / sum(samples), 2),
+        "p50_ms": round(median * 1000, 4),
+        "p99_ms": round(ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))] * 1000, 4),
+    }
+
+
+def run_size(nodes: int, min_time: float, max_samples: int, seed: int) -> dict[str, dict]:
+    from fastapi.testclient import TestClient
+
+    import main
+    from cache import response_cache
+    from database import SessionLocal
+    from logic import calculate_blast_radius
+    from synthetic import generate_menu, load_menu
+
+    rng = random.Random(seed)
+    menu = generate_menu(nodes, seed=seed)
+    graph = menu.compile()
+    names = [i["name"] for i in menu.ingredients]
+    menu_items = list(menu.menu_graph)
+    # Fixed rotations (not fresh random picks) so every run times the same mix of inputs.
+    popular = itertools.cycle(menu.popular_ingredients(5))
+    sampled = itertools.cycle(rng.sample(names, min(len(names), 64)))
+    results: dict[str, dict] = {}
+
+    def case(name: str, fn: Callable[[], object], samples: int = max_samples) -> None:
+        # /simulate-rush draws from the global RNG; seed it so runs compare like with like.
+        random.seed(f"{seed}/{nodes}/{name}")
+        results[f"{nodes}/{name}"] = measure(fn, min_time, samples)
+        r = results[f"{nodes}/{name}"]
+        print(f"  {name:<28} {r['ops_per_sec']:>12,.1f} ops/s  p50 {r['p50_ms']:>9.3f} ms  p99 {r['p99_ms']:>9.3f} ms")
+
+    print(f"{nodes:,} nodes: {len(menu.menu_graph):,} menu items, {len(menu.sub_recipe_graph):,} sub-recipes, "
+          f"{len(menu.ingredients):,} ingredients")
+    case("graph.compile", menu.compile, samples=max(10, max_samples // 20))
+    case("blast_radius.popular", lambda: calculate_blast_radius(next(popular), graph=graph))
+    case("blast_radius.random", lambda: calculate_blast_radius(next(sampled), graph=graph))
+
+    with TestClient(main.app) as client:
+        db = SessionLocal()
+        try:
+            load_menu(db, menu)
+        finally:
+            db.close()
+
+        def get(path: str) -> None:
+            response_cache.clear()
+            client.get(path).raise_for_status()
+
+        def post(path: str, **kwargs) -> None:
+            client.post(path, **kwargs).raise_for_status()
+
+        def sales() -> str:
+            lines = [json.dumps({"menu_item": rng.choice(menu_items), "quantity": rng.randint(1, 3)})
+                     for _ in range(SALES_PER_BATCH)]
+            return "\n".join(lines)
+
+        case("http.blast_radius.popular", lambda: get(f"/blast-radius/{next(popular)}"))
+        case("http.blast_radius.random", lambda: get(f"/blast-radius/{next(sampled)}"))
+        case("http.blast_radius.pruned", lambda: get(f"/blast-radius/{next(popular)}?{PRUNED_QUERY}"))
+        case("http.inventory.page", lambda: get("/inventory?limit=100"))
+        case("http.inventory.full", lambda: get("/inventory"), samples=max(10, max_samples // 10))
+        case("http.restock", lambda: post(f"/restock/{next(sampled)}"))
+        case("http.simulate_rush", lambda: post("/simulate-rush"))
+        case("http.stock_movements.1k", lambda: post("/stock-movements", content=sales()),
+             samples=max(10, max_samples // 10))
+        # Last: /seed replaces the synthetic ingredients with the built-in ones.
+        case("http.seed", lambda: post("/seed"), samples=max(10, max_samples // 10))
+    return results
+
+
+def compare(results: dict[str, dict], baseline: dict[str, dict], threshold: float) -> list[str]:
+    """Return a message for every case that regressed past the threshold."""
+    failures = []
+    for key, result in sorted(results.items()):
+        base = baseline.get(key)
+        if base is None:
+            continue
+        if result["ops_per_sec"] < base["ops_per_sec"] * (1 - threshold):
+            failures.append(f"{key}: throughput {result['ops_per_sec']:,.1f} ops/s vs baseline {base['ops_per_sec']:,.1f}")
+        if result["p50_ms"] > base["p50_ms"] * (1 + threshold):
+            failures.append(f"{key}: p50 {result['p50_ms']:.3f} ms vs baseline {base['p50_ms']:.3f} ms")
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed relative regression (default 0.25 = 25%%)")
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds spent per case")
+    parser.add_argument("--max-samples", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--update", action="store_true", help="write results as the new baseline")
+    args = parser.parse_args()
+    baseline_path = os.path.abspath(args.baseline)
+
+    # The app opens ./holymole.db; run it in a scratch directory.
+    workdir = tempfile.mkdtemp(prefix="holymole-bench-")
+    os.chdir(workdir)
+
+    results: dict[str, dict] = {}
+    for nodes in args.sizes:
+        results.update(run_size(nodes, args.min_time, args.max_samples, args.seed))
+
+    stored = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            stored = json.load(f)
+
+    if args.update:
+        merged = {**stored.get("results", {}), **results}
+        meta = {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()}
+        with open(baseline_path, "w") as f:
+            json.dump({"meta": meta, "results": merged}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"baseline written to {baseline_path}")
+        return
+
+    if not stored:
+        print(f"no baseline at {baseline_path}; run with --update to record one")
+        return
+    failures = compare(results, stored["results"], args.threshold)
+    if failures:
+        print(f"\n{len(failures)} regression(s) beyond {args.threshold:.0%}:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print(f"\nno regressions beyond {args.threshold:.0%} against {baseline_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Scenarios-per-second benchmark for the Monte Carlo rush simulator.
+
+    python benchmarks/simulation_bench.py --scenarios 50000
+
+Runs the same seeded workload with 1, 2, 4, ... workers up to the core count and
+prints throughput and speed-up relative to a single worker. Uses the built-in menu
+and seed inventory, so no database is needed.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logic import compile_builtin_graph  # noqa: E402
+from main import SEED_INGREDIENTS  # noqa: E402
+from risk import get_risk_matrix  # noqa: E402
+from simulation import MAX_WORKERS, build_inputs, run_scenarios  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", type=int, default=50_000)
+    parser.add_argument("--hours", type=float, default=4.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-workers", type=int, default=MAX_WORKERS)
+    args = parser.parse_args()
+    # run_scenarios caps workers at the shared pool size.
+    args.max_workers = max(1, min(args.max_workers, MAX_WORKERS))
+
+    matrix = get_risk_matrix(compile_builtin_graph())
+    stock = {d["name"]: (d["quantity"], d["daily_usage"]) for d in SEED_INGREDIENTS}
+    inputs = build_inputs(matrix, stock, hours=args.hours)
+
+    counts = [1]
+    while counts[-1] * 2 <= args.max_workers:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != args.max_workers:
+        counts.append(args.max_workers)
+
+    # Warm up at each size so starting the shared pool's processes is not timed.
+    baseline = None
+    print(f"{args.scenarios} scenarios, {args.hours}h rush, {len(matrix.ingredients)} rows x {len(matrix.menu_items)} menu items")
+    for workers in counts:
+        run_scenarios(inputs, min(args.scenarios, 1000 * workers), seed=args.seed, workers=workers)
+        start = time.perf_counter()
+        run_scenarios(inputs, args.scenarios, seed=args.seed, workers=workers)
+        rate = args.scenarios / (time.perf_counter() - start)
+        baseline = baseline or rate
+        print(f"  workers={workers:<3} {rate:12,.0f} scenarios/s  speed-up x{rate / baseline:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Synthetic recipe DAGs for benchmarks.
+
+Generates menus shaped like a real kitchen at any size: most nodes are raw
+ingredients whose popularity follows a Zipf curve (a few, like limes or tortillas,
+appear in almost everything), sub-recipes are stacked in levels so chains such as
+Spicy Mayo -> Mayo -> Eggs run several deep, and menu items draw on both.
+"""
+import itertools
+import os
+import random
+import sys
+from dataclasses import dataclass, field
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.orm import Session  # noqa: E402
+
+from database import Ingredient, MenuItem, RecipeEdge  # noqa: E402
+from graph_store import bump_revision  # noqa: E402
+from logic import CompiledGraph  # noqa: E402
+
+MENU_SHARE = 0.15
+SUB_RECIPE_SHARE = 0.20
+SUB_RECIPE_LEVELS = 6
+CATEGORIES = ("Produce", "Proteins", "Dairy", "Dry Goods", "Sauces", "Beverages")
+MENU_SECTIONS = 12
+
+
+@dataclass
+class SyntheticMenu:
+    menu_graph: dict[str, list[str]]
+    sub_recipe_graph: dict[str, list[str]]
+    revenue_impact: dict[str, float]
+    ingredients: list[dict] = field(default_factory=list)
+    quantities: dict[str, dict[str, float]] = field(default_factory=dict)
+    categories: dict[str, str] = field(default_factory=dict)
+
+    @property
+    def node_count(self) -> int:
+        return len(self.menu_graph) + len(self.sub_recipe_graph) + len(self.ingredients)
+
+    def compile(self, revision: int = 0) -> CompiledGraph:
+        return CompiledGraph(
+            self.menu_graph, self.sub_recipe_graph, self.revenue_impact, revision, quantities=self.quantities
+        )
+
+    def popular_ingredients(self, k: int) -> list[str]:
+        """The k most used raw ingredients (largest blast radius)."""
+        return [i["name"] for i in self.ingredients[:k]]
+
+
+def generate_menu(nodes: int, seed: int = 0) -> SyntheticMenu:
+    rng = random.Random(seed)
+    n_menu = max(1, int(nodes * MENU_SHARE))
+    n_sub = max(SUB_RECIPE_LEVELS, int(nodes * SUB_RECIPE_SHARE))
+    n_raw = max(1, nodes - n_menu - n_sub)
+
+    raw = [f"Ingredient {i:06d}" for i in range(n_raw)]
+    # Zipf popularity: ingredient 0 is the "lime" of this kitchen.
+    raw_weights = [1.0 / (rank + 1) ** 1.1 for rank in range(n_raw)]
+    raw_cumulative = list(itertools.accumulate(raw_weights))
+
+    def pick_raw(k: int) -> list[str]:
+        return list(dict.fromkeys(rng.choices(raw, cum_weights=raw_cumulative, k=k)))
+
+    sub_recipe_graph: dict[str, list[str]] = {}
+    quantities: dict[str, dict[str, float]] = {}
+    levels: list[list[str]] = []
+    per_level = n_sub // SUB_RECIPE_LEVELS
+    for level in range(SUB_RECIPE_LEVELS):
+        count = per_level if level < SUB_RECIPE_LEVELS - 1 else n_sub - per_level * level
+        names = [f"Sub-recipe L{level} {i:06d}" for i in range(count)]
+        for name in names:
+            children = pick_raw(rng.randint(1, 4))
+            if levels:
+                # Build on the level directly below so chains really are deep.
+                children.append(rng.choice(levels[-1]))
+                if len(levels) > 1 and rng.random() < 0.3:
+                    children.append(rng.choice(rng.choice(levels[:-1])))
+            children = list(dict.fromkeys(children))
+            sub_recipe_graph[name] = children
+            quantities[name] = {c: round(rng.uniform(0.05, 1.0), 3) for c in children}
+        levels.append(names)
+    all_subs = [name for level in levels for name in level]
+    # Later levels are rarer in dishes than simple prep, but do appear.
+    sub_cumulative = list(itertools.accumulate(1.0 / (1 + int(name.split()[1][1:])) for name in all_subs))
+
+    menu_graph: dict[str, list[str]] = {}
+    revenue_impact: dict[str, float] = {}
+    categories: dict[str, str] = {}
+    for i in range(n_menu):
+        name = f"Menu Item {i:06d}"
+        children = pick_raw(rng.randint(2, 6))
+        children += rng.choices(all_subs, cum_weights=sub_cumulative, k=rng.randint(0, 3))
+        children = list(dict.fromkeys(children))
+        menu_graph[name] = children
+        quantities[name] = {c: round(rng.uniform(0.05, 0.5), 3) for c in children}
+        revenue_impact[name] = round(rng.uniform(20.0, 400.0), 2)
+        categories[name] = f"Section {i % MENU_SECTIONS}"
+
+    ingredients = []
+    for rank, name in enumerate(raw):
+        daily_usage = round(max(0.1, 50.0 * raw_weights[rank] * rng.uniform(0.5, 1.5)), 3)
+        par_level = round(daily_usage * 2, 2)
+        ingredients.append(
+            {
+                "name": name,
+                "category": CATEGORIES[rank % len(CATEGORIES)],
+                "quantity": round(par_level * rng.uniform(0.2, 3.0), 2),
+                "unit": "unit",
+                "unit_cost": round(rng.uniform(0.2, 30.0), 2),
+                "par_level": par_level,
+                "daily_usage": daily_usage,
+            }
+        )
+    return SyntheticMenu(menu_graph, sub_recipe_graph, revenue_impact, ingredients, quantities, categories)
+
+
+def load_menu(db: Session, menu: SyntheticMenu) -> None:
+    """Replace the menu, recipe edges and ingredients in `db` with the synthetic ones."""
+    db.query(RecipeEdge).delete()
+    db.query(MenuItem).delete()
+    db.query(Ingredient).delete()
+    db.bulk_insert_mappings(
+        MenuItem,
+        [{"name": n, "revenue_per_hour": r, "category": menu.categories.get(n)} for n, r in menu.revenue_impact.items()],
+    )
+    db.bulk_insert_mappings(
+        RecipeEdge,
+        [
+            {"parent": parent, "child": child, "quantity": menu.quantities[parent][child]}
+            for graph in (menu.menu_graph, menu.sub_recipe_graph)
+            for parent, children in graph.items()
+            for child in children
+        ],
+    )
+    db.bulk_insert_mappings(Ingredient, menu.ingredients)
+    bump_revision(db)
+    db.commit()
@@ -0,0 +1,184 @@
+"""
+Level-of-detail views of blast-radius payloads for Holy Mole.
+A hub ingredient in a large menu reaches thousands of nodes, more than a browser graph
+can draw. prune_blast_radius cuts a payload from either blast-radius source down by
+depth, keeps the top-K menu items by revenue and collapses the rest into summary nodes;
+columnar_blast_radius re-encodes a payload as parallel arrays with integer edge pairs.
+"""
+from collections import deque
+from typing import Any
+
+from logic import DEFAULT_MENU_CATEGORY
+
+GROUP_BY = ("category",)
+PAYLOAD_FORMATS = ("full", "compact")
+NODE_TYPES = ("ingredient", "sub_recipe", "menu_item", "menu_group")
+# Label of the single collapsed node used when hidden menu items are not grouped.
+OTHER_GROUP = "Other menu items"
+
+
+def prune_blast_radius(
+    payload: dict[str, Any],
+    max_depth: int | None = None,
+    top_k: int | None = None,
+    group_by: str | None = None,
+    categories: dict[str, str] | None = None,
+) -> dict[str, Any]:
+    """
+    Return a smaller copy of a blast-radius payload for drawing.
+
+    max_depth keeps nodes at most that many edges above the ingredient. top_k keeps the
+    k highest-revenue menu items as their own nodes; the others collapse into one
+    `menu_group` node per category when group_by="category" (all of them collapse if
+    top_k is not set), or into a single "Other menu items" node. Once anything is
+    collapsed only sub-recipes on a path to a drawn menu item stay, and a group is fed
+    by its members' remaining inputs (the ingredient itself if none remain). Edges are
+    de-duplicated. Totals and `affected_menu_items` still cover the whole blast radius;
+    `pruned` counts what was left out.
+    """
+    root = payload["ingredient"]
+    # One pass de-duplicates edges and builds both adjacency maps.
+    seen: set[tuple[str, str]] = set()
+    feeds: dict[str, list[str]] = {}
+    fed_by: dict[str, list[str]] = {}
+    for edge in payload["edges"]:
+        source, target = pair = edge["from"], edge["to"]
+        if pair in seen:
+            continue
+        seen.add(pair)
+        feeds.setdefault(source, []).append(target)
+        fed_by.setdefault(target, []).append(source)
+    summary = {
+        "max_depth": max_depth,
+        "top_k": top_k,
+        "group_by": group_by,
+        "nodes_total": len(payload["nodes"]),
+        "edges_total": len(seen),
+    }
+    if not payload["nodes"]:
+        empty = {"nodes_shown": 0, "edges_shown": 0, "beyond_depth": 0, "collapsed": 0}
+        return {**payload, "edges": [], "pruned": {**summary, **empty}}
+
+    depth = {root: 0}
+    queue = deque([root])
+    while queue:
+        node = queue.popleft()
+        if max_depth is not None and depth[node] >= max_depth:
+            continue
+        for target in feeds.get(node, ()):
+            if target not in depth:
+                depth[target] = depth[node] + 1
+                queue.append(target)
+
+    revenue = {a["menu_item"]: a["revenue_per_hour"] for a in payload["affected_with_revenue"]}
+    menu_items = [n["id"] for n in payload["nodes"] if n["type"] == "menu_item" and n["id"] in depth]
+    ranked = sorted(menu_items, key=lambda m: (-revenue.get(m, 0.0), m))
+    if top_k is not None:
+        shown, collapsed = ranked[:top_k], ranked[top_k:]
+    elif group_by is not None:
+        shown, collapsed = [], ranked
+    else:
+        shown, collapsed = menu_items, []
+
+    groups: dict[str, dict[str, Any]] = {}
+    group_of: dict[str, str] = {}
+    for menu_item in collapsed:
+        if group_by == "category":
+            label = (categories or {}).get(menu_item, DEFAULT_MENU_CATEGORY)
+        else:
+            label = OTHER_GROUP
+        group = groups.get(label)
+        if group is None:
+            group = groups[label] = {
+                "id": f"group:{label}",
+                "label": label,
+                "type": "menu_group",
+                "count": 0,
+                "revenue_per_hour": 0.0,
+            }
+        group["count"] += 1
+        group["revenue_per_hour"] += revenue.get(menu_item, 0.0)
+        group_of[menu_item] = group["id"]
+
+    if group_of:
+        # Only what leads to a drawn menu item survives collapsing.
+        keep = {root, *shown}
+        stack = list(shown)
+        while stack:
+            for source in fed_by.get(stack.pop(), ()):
+                if source not in keep and source in depth:
+                    keep.add(source)
+                    stack.append(source)
+    else:
+        keep = set(depth)
+
+    pruned_edges: dict[tuple[str, str], None] = {}
+    for target, sources in fed_by.items():
+        if target in keep:
+            for source in sources:
+                if source in keep:
+                    pruned_edges[(source, target)] = None
+        elif target in group_of:
+            group_id = group_of[target]
+            inputs = [source for source in sources if source in keep]
+            for source in inputs or (root,):
+                pruned_edges[(source, group_id)] = None
+    nodes = [n for n in payload["nodes"] if n["id"] in keep]
+    for group in sorted(groups.values(), key=lambda g: -g["revenue_per_hour"]):
+        nodes.append({**group, "revenue_per_hour": round(group["revenue_per_hour"], 2)})
+    edge_list = [{"from": source, "to": target} for source, target in pruned_edges]
+
+    affected_with_revenue = payload["affected_with_revenue"]
+    if top_k is not None:
+        affected_with_revenue = sorted(affected_with_revenue, key=lambda a: (-a["revenue_per_hour"], a["menu_item"]))[:top_k]
+    return {
+        **payload,
+        "nodes": nodes,
+        "edges": edge_list,
+        "affected_with_revenue": affected_with_revenue,
+        "pruned": {
+            **summary,
+            "nodes_shown": len(nodes),
+            "edges_shown": len(edge_list),
+            "beyond_depth": len(payload["nodes"]) - len(depth),
+            "collapsed": len(group_of),
+        },
+    }
+
+
+def columnar_blast_radius(payload: dict[str, Any]) -> dict[str, Any]:
+    """
+    Encode a blast-radius payload column-wise: `node_ids` with `node_types` as indexes
+    into `types`, `edges` as a flat [from, to, from, to, ...] list of node indexes, and
+    collapsed groups as {node, label, count, revenue_per_hour} referencing their index.
+    """
+    index = {node["id"]: i for i, node in enumerate(payload["nodes"])}
+    type_codes = {name: code for code, name in enumerate(NODE_TYPES)}
+    edges: list[int] = []
+    for edge in payload["edges"]:
+        edges.append(index[edge["from"]])
+        edges.append(index[edge["to"]])
+    affected = payload["affected_with_revenue"]
+    compact = {
+        "format": "compact",
+        "ingredient": payload["ingredient"],
+        "types": list(NODE_TYPES),
+        "node_ids": list(index),
+        "node_types": [type_codes[node["type"]] for node in payload["nodes"]],
+        "edges": edges,
+        "groups": [
+            {"node": index[node["id"]], "label": node["label"], "count": node["count"], "revenue_per_hour": node["revenue_per_hour"]}
+            for node in payload["nodes"]
+            if node["type"] == "menu_group"
+        ],
+        "affected_menu_items": payload["affected_menu_items"],
+        "affected_with_revenue": {
+            "menu_item": [a["menu_item"] for a in affected],
+            "revenue_per_hour": [a["revenue_per_hour"] for a in affected],
+        },
+        "total_menu_count": payload["total_menu_count"],
+        "total_revenue_risk_per_hour": payload["total_revenue_risk_per_hour"],
+    }
+    if "pruned" in payload:
+        compact["pruned"] = payload["pruned"]
+    return compact
@@ -0,0 +1,586 @@
+"""
+Bulk import and export of ingredients, menu items and recipe edges for Holy Mole.
+Imports read CSV or Parquet row by row, validate a chunk at a time and write each chunk
+with one core executemany in its own transaction, reporting progress after every
+commit. Exports stream the table out in chunks (yield_per), so neither direction holds
+the whole table in memory. Parquet needs the optional pyarrow package.
+
+    python bulk.py import ingredients supplier.csv --location austin --mode upsert
+    python bulk.py export recipe_edges edges.parquet
+"""
+import argparse
+import csv
+import io
+import math
+import sys
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, BinaryIO, Callable, Iterable, Iterator
+
+from sqlalchemy import bindparam, delete, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from database import Ingredient, MenuItem, RecipeEdge, begin_write
+from graph_store import bump_revision
+from ledger import bump_inventory_version, record_deltas, reset_ledger
+
+# Rows validated and written per transaction.
+IMPORT_CHUNK_ROWS = 5000
+EXPORT_CHUNK_ROWS = 5000
+# Row errors listed in a report; the count keeps going past this.
+MAX_REPORTED_ERRORS = 100
+
+FORMATS = ("csv", "parquet")
+MODES = ("upsert", "replace")
+ON_ERROR = ("abort", "skip")
+
+
+class BulkImportError(ValueError):
+    """A row or file could not be imported."""
+
+
+@dataclass(frozen=True)
+class Column:
+    name: str
+    kind: type
+    required: bool = True
+    default: Any = None
+
+
+TABLES: dict[str, tuple[Any, tuple[Column, ...]]] = {
+    "ingredients": (
+        Ingredient,
+        (
+            Column("name", str),
+            Column("category", str),
+            Column("quantity", float, False, 0.0),
+            Column("unit", str),
+            Column("unit_cost", float, False, 0.0),
+            Column("par_level", float, False, 0.0),
+            Column("daily_usage", float, False, 0.0),
+        ),
+    ),
+    "menu_items": (
+        MenuItem,
+        (Column("name", str), Column("revenue_per_hour", float, False, 0.0), Column("category", str, False)),
+    ),
+    "recipe_edges": (RecipeEdge, (Column("parent", str), Column("child", str), Column("quantity", float, False, 1.0))),
+}
+
+
+def _spec(table: str) -> tuple[Any, tuple[Column, ...]]:
+    try:
+        return TABLES[table]
+    except KeyError:
+        raise BulkImportError(f"unknown table '{table}'; expected one of {', '.join(TABLES)}")
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise BulkImportError("Parquet support needs the optional 'pyarrow' package")
+    return pyarrow, pyarrow.parquet
+
+
+# ----- Reading -----
+
+def read_csv(fileobj: BinaryIO) -> Iterator[tuple[int, dict]]:
+    """Yield (line number, row) from a CSV file with a header row."""
+    reader = csv.DictReader(io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline=""))
+    if reader.fieldnames is not None:
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_parquet(fileobj: BinaryIO) -> Iterator[tuple[int, dict]]:
+    """Yield (row number, row) from a Parquet file, one record batch in memory at a time."""
+    _, pq = _require_pyarrow()
+    row_no = 0
+    for batch in pq.ParquetFile(fileobj).iter_batches(batch_size=IMPORT_CHUNK_ROWS):
+        for row in batch.to_pylist():
+            row_no += 1
+            yield row_no, {str(k).strip().lower(): v for k, v in row.items()}
+
+
+def read_rows(fileobj: BinaryIO, fmt: str) -> Iterator[tuple[int, dict]]:
+    if fmt == "csv":
+        return read_csv(fileobj)
+    if fmt == "parquet":
+        return read_parquet(fileobj)
+    raise BulkImportError(f"unknown format '{fmt}'; expected csv or parquet")
+
+
+def validate_row(columns: tuple[Column, ...], row: dict, line_no: int) -> dict:
+    """
+    Coerce one raw row to column values, or raise BulkImportError naming the line.
+    Optional columns that are missing or blank are left out, so an update keeps the
+    stored value; _with_defaults fills them in for inserts.
+    """
+    out = {}
+    for col in columns:
+        value = row.get(col.name)
+        if isinstance(value, str):
+            value = value.strip()
+        if value is None or value == "":
+            if col.required:
+                raise BulkImportError(f"line {line_no}: '{col.name}' is required")
+            continue
+        if col.kind is float:
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                raise BulkImportError(f"line {line_no}: '{col.name}' must be a number")
+            if not math.isfinite(value) or value < 0:
+                raise BulkImportError(f"line {line_no}: '{col.name}' must be a finite number >= 0")
+        else:
+            value = str(value)
+        out[col.name] = value
+    return out
+
+
+# ----- Writing -----
+
+@dataclass
+class ImportReport:
+    table: str
+    mode: str
+    rows_read: int = 0
+    inserted: int = 0
+    updated: int = 0
+    skipped: int = 0
+    chunks: int = 0
+    aborted: bool = False
+    error_count: int = 0
+    errors: list[str] = field(default_factory=list)
+
+    def add_error(self, message: str) -> None:
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(message)
+
+    def as_dict(self) -> dict:
+        return {
+            "table": self.table,
+            "mode": self.mode,
+            "rows_read": self.rows_read,
+            "rows_written": self.inserted + self.updated,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "skipped": self.skipped,
+            "chunks": self.chunks,
+            "aborted": self.aborted,
+            # Aborted after earlier upsert chunks were committed; those rows stay written.
+            "partial": self.aborted and self.inserted + self.updated > 0,
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
+
+
+def _with_defaults(columns: tuple[Column, ...], row: dict) -> dict:
+    return {col.name: row.get(col.name, col.default) for col in columns}
+
+
+_ingredients = Ingredient.__table__
+_INGREDIENT_COLUMNS = TABLES["ingredients"][1]
+_INGREDIENT_FIELDS = tuple(c.name for c in _INGREDIENT_COLUMNS if c.name != "name")
+
+
+@lru_cache(maxsize=None)
+def _update_ingredient(fields: tuple[str, ...]):
+    return (
+        update(_ingredients)
+        .where(_ingredients.c.id == bindparam("b_id"))
+        .values({name: bindparam(f"b_{name}") for name in fields})
+    )
+
+
+def _write_ingredients(db: Session, rows: list[dict], report: ImportReport, log_movements: bool) -> None:
+    by_name = {row["name"]: row for row in rows}
+    existing = {
+        name: (ingredient_id, quantity)
+        for ingredient_id, name, quantity in db.execute(
+            select(Ingredient.id, Ingredient.name, Ingredient.quantity).where(Ingredient.name.in_(by_name))
+        )
+    }
+    # Updates set only the columns each row supplies; rows are batched per column set.
+    updates: dict[tuple[str, ...], list[dict]] = {}
+    inserts = []
+    deltas: dict[int, float] = {}
+    for name, row in by_name.items():
+        if name in existing:
+            ingredient_id, quantity = existing[name]
+            fields = tuple(k for k in _INGREDIENT_FIELDS if k in row)
+            updates.setdefault(fields, []).append({"b_id": ingredient_id, **{f"b_{k}": row[k] for k in fields}})
+            if "quantity" in row:
+                deltas[ingredient_id] = row["quantity"] - quantity
+        else:
+            inserts.append(_with_defaults(_INGREDIENT_COLUMNS, row))
+    for fields, params in updates.items():
+        db.execute(_update_ingredient(fields), params)
+    if inserts:
+        db.execute(_ingredients.insert(), inserts)
+        if log_movements:
+            new_names = [row["name"] for row in inserts]
+            for ingredient_id, name in db.execute(
+                select(Ingredient.id, Ingredient.name).where(Ingredient.name.in_(new_names))
+            ):
+                deltas.setdefault(ingredient_id, by_name[name].get("quantity", 0.0))
+    if log_movements:
+        record_deltas(db, deltas, "import")
+    # Category/unit-only updates log no movements but still change what /inventory serves.
+    bump_inventory_version(db)
+    report.updated += sum(len(params) for params in updates.values())
+    report.inserted += len(inserts)
+
+
+def _write_upsert(db: Session, table_name: str, key: tuple[str, ...], rows: list[dict], report: ImportReport) -> None:
+    """Insert or update on the natural key; an update sets only the columns the row supplies."""
+    model, columns = TABLES[table_name]
+    table = model.__table__
+    deduped = list({tuple(row[k] for k in key): row for row in rows}.values())
+    existing = db.execute(
+        select(*(table.c[k] for k in key)).where(
+            table.c[key[0]].in_({row[key[0]] for row in deduped})
+        )
+    ).all()
+    existing = {tuple(r) for r in existing}
+    by_fields: dict[tuple[str, ...], list[dict]] = {}
+    for row in deduped:
+        fields = tuple(c.name for c in columns if c.name not in key and c.name in row)
+        by_fields.setdefault(fields, []).append(_with_defaults(columns, row))
+    for fields, values in by_fields.items():
+        stmt = sqlite_insert(table)
+        if fields:
+            stmt = stmt.on_conflict_do_update(index_elements=list(key), set_={f: stmt.excluded[f] for f in fields})
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=list(key))
+        db.execute(stmt, values)
+    updated = sum(1 for row in deduped if tuple(row[k] for k in key) in existing)
+    report.updated += updated
+    report.inserted += len(deduped) - updated
+    bump_revision(db)
+
+
+class _EdgeGraph:
+    """In-memory parent -> children map used to keep recipe imports acyclic."""
+
+    def __init__(self, db: Session):
+        self.children: dict[str, set[str]] = {}
+        for parent, child in db.execute(select(RecipeEdge.parent, RecipeEdge.child)):
+            self.children.setdefault(parent, set()).add(child)
+
+    def _reaches(self, start: str, target: str) -> bool:
+        stack, seen = [start], {start}
+        while stack:
+            node = stack.pop()
+            if node == target:
+                return True
+            for nxt in self.children.get(node, ()):
+                if nxt not in seen:
+                    seen.add(nxt)
+                    stack.append(nxt)
+        return False
+
+    def _acyclic(self) -> bool:
+        indegree: dict[str, int] = {}
+        for parent, kids in self.children.items():
+            indegree.setdefault(parent, 0)
+            for kid in kids:
+                indegree[kid] = indegree.get(kid, 0) + 1
+        ready = [n for n, d in indegree.items() if d == 0]
+        seen = 0
+        while ready:
+            node = ready.pop()
+            seen += 1
+            for kid in self.children.get(node, ()):
+                indegree[kid] -= 1
+                if indegree[kid] == 0:
+                    ready.append(kid)
+        return seen == len(indegree)
+
+    def add_chunk(self, rows: list[tuple[int, dict]]) -> list[tuple[int, str]]:
+        """
+        Add a chunk's edges, returning (line, message) for each edge that would close a
+        cycle (those are left out). One topological pass per chunk; edge-by-edge checks
+        only when that pass finds a cycle.
+        """
+        added = []
+        for _, row in rows:
+            kids = self.children.setdefault(row["parent"], set())
+            if row["child"] not in kids:
+                kids.add(row["child"])
+                added.append((row["parent"], row["child"]))
+        if self._acyclic():
+            return []
+        for parent, child in added:
+            self.children[parent].discard(child)
+        rejected = []
+        for line_no, row in rows:
+            parent, child = row["parent"], row["child"]
+            if parent == child or self._reaches(child, parent):
+                rejected.append((line_no, f"line {line_no}: {parent} -> {child} would create a cycle"))
+            else:
+                self.children.setdefault(parent, set()).add(child)
+        return rejected
+
+
+def _drop_recipes(db: Session, parents: set[str]) -> None:
+    names = list(parents)
+    for start in range(0, len(names), 500):
+        db.execute(delete(RecipeEdge).where(RecipeEdge.parent.in_(names[start : start + 500])))
+
+
+def import_rows(
+    db: Session,
+    table: str,
+    rows: Iterable[tuple[int, dict]],
+    mode: str = "upsert",
+    on_error: str = "abort",
+    chunk_rows: int = IMPORT_CHUNK_ROWS,
+    progress: Callable[[dict], None] | None = None,
+) -> dict:
+    """
+    Import (line number, raw row) pairs into `table`, validating and writing a chunk at
+    a time. `upsert` updates rows matching on the natural key (ingredient name, menu
+    item name, parent+child) and commits each chunk on its own, so after an abort the
+    earlier chunks stay. `replace` empties the table and loads the file in a single
+    transaction: an abort leaves the old table untouched, and on success the stock
+    ledger restarts (ingredients) or the removed menu items' recipe edges go too.
+    on_error="abort" stops at the first bad chunk; "skip" drops bad rows and carries on.
+    """
+    model, columns = _spec(table)
+    if mode not in MODES:
+        raise BulkImportError(f"mode must be one of {', '.join(MODES)}")
+    if on_error not in ON_ERROR:
+        raise BulkImportError(f"on_error must be one of {', '.join(ON_ERROR)}")
+    report = ImportReport(table, mode)
+
+    replaced_menu: set[str] = set()
+    if mode == "replace":
+        if table == "menu_items":
+            replaced_menu = set(db.scalars(select(MenuItem.name)))
+        db.query(model).delete()
+        if table != "ingredients":
+            bump_revision(db)
+    edges = _EdgeGraph(db) if table == "recipe_edges" else None
+
+    def write(chunk: list[tuple[int, dict]]) -> bool:
+        valid: list[tuple[int, dict]] = []
+        for line_no, raw in chunk:
+            try:
+                valid.append((line_no, validate_row(columns, raw, line_no)))
+            except BulkImportError as e:
+                report.add_error(str(e))
+                if on_error == "abort":
+                    return False
+                report.skipped += 1
+        if edges is not None:
+            rejected = edges.add_chunk(valid)
+            for _, message in rejected:
+                report.add_error(message)
+            if rejected and on_error == "abort":
+                return False
+            bad = {line_no for line_no, _ in rejected}
+            report.skipped += len(bad)
+            valid = [(line_no, row) for line_no, row in valid if line_no not in bad]
+        values = [row for _, row in valid]
+        if values:
+            if mode == "upsert":
+                # Each chunk is its own transaction; lock before reading current quantities.
+                begin_write(db)
+            if table == "ingredients":
+                _write_ingredients(db, values, report, log_movements=mode == "upsert")
+            elif table == "menu_items":
+                _write_upsert(db, table, ("name",), values, report)
+            else:
+                _write_upsert(db, table, ("parent", "child"), values, report)
+        if mode == "upsert":
+            db.commit()
+        else:
+            db.flush()
+        report.chunks += 1
+        if progress is not None:
+            progress(report.as_dict())
+        return True
+
+    chunk: list[tuple[int, dict]] = []
+    try:
+        for line_no, raw in rows:
+            report.rows_read += 1
+            chunk.append((line_no, raw))
+            if len(chunk) >= chunk_rows:
+                if not write(chunk):
+                    report.aborted = True
+                    break
+                chunk = []
+        else:
+            if (chunk or report.chunks == 0) and not write(chunk):
+                report.aborted = True
+    except (csv.Error, UnicodeDecodeError) as e:
+        report.add_error(f"unreadable file: {e}")
+        report.aborted = True
+    if report.aborted:
+        db.rollback()
+        if mode == "replace":
+            report.inserted = report.updated = 0
+    elif mode == "replace":
+        if table == "ingredients":
+            reset_ledger(db)
+        elif table == "menu_items":
+            _drop_recipes(db, replaced_menu - set(db.scalars(select(MenuItem.name))))
+        db.commit()
+    return report.as_dict()
+
+
+# ----- Export -----
+
+def _export_rows(db: Session, table: str, chunk_rows: int) -> Iterator[list[tuple]]:
+    model, columns = _spec(table)
+    stmt = select(*(getattr(model, c.name) for c in columns)).order_by(model.id)
+    result = db.execute(stmt.execution_options(yield_per=chunk_rows))
+    for partition in result.partitions():
+        yield [tuple(row) for row in partition]
+
+
+def export_csv(db: Session, table: str, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    """Stream `table` as CSV with a header row, one chunk of rows per yielded block."""
+    _, columns = _spec(table)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([c.name for c in columns])
+    for rows in _export_rows(db, table, chunk_rows):
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _ByteSink:
+    """Write-only file object that hands out what has been written since the last drain."""
+
+    closed = False
+
+    def __init__(self):
+        self._parts: list[bytes] = []
+        self._pos = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self) -> None:
+        pass
+
+    def writable(self) -> bool:
+        return True
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def export_parquet(db: Session, table: str, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    """Stream `table` as Parquet, one row group per chunk."""
+    pa, pq = _require_pyarrow()
+    _, columns = _spec(table)
+    schema = pa.schema([(c.name, pa.float64() if c.kind is float else pa.string()) for c in columns])
+    sink = _ByteSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for rows in _export_rows(db, table, chunk_rows):
+            writer.write_table(pa.Table.from_arrays([pa.array(col) for col in zip(*rows)], schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def export(db: Session, table: str, fmt: str) -> Iterator[bytes]:
+    if fmt == "csv":
+        return export_csv(db, table)
+    if fmt == "parquet":
+        _require_pyarrow()
+        return export_parquet(db, table)
+    raise BulkImportError(f"unknown format '{fmt}'; expected csv or parquet")
+
+
+def _format_for(path: str, fmt: str | None) -> str:
+    if fmt:
+        return fmt
+    return "parquet" if path.lower().endswith((".parquet", ".pq")) else "csv"
+
+
+def main() -> None:
+    from database import DEFAULT_LOCATION, get_shard
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="load a CSV/Parquet file into a table")
+    imp.add_argument("table", choices=list(TABLES))
+    imp.add_argument("path")
+    imp.add_argument("--mode", choices=MODES, default="upsert")
+    imp.add_argument("--on-error", choices=ON_ERROR, default="abort")
+    imp.add_argument("--chunk-rows", type=int, default=IMPORT_CHUNK_ROWS)
+    exp = sub.add_parser("export", help="write a table to a CSV/Parquet file")
+    exp.add_argument("table", choices=list(TABLES))
+    exp.add_argument("path")
+    for p in (imp, exp):
+        p.add_argument("--format", choices=FORMATS)
+        p.add_argument("--location", default=DEFAULT_LOCATION)
+        p.add_argument("--create-location", action="store_true")
+    args = parser.parse_args()
+
+    fmt = _format_for(args.path, args.format)
+    shard = get_shard(args.location, create=args.create_location)
+    db = shard.SessionLocal()
+    try:
+        if args.command == "import":
+            def show(report: dict) -> None:
+                print(
+                    f"\r{report['rows_read']:,} read, {report['rows_written']:,} written, "
+                    f"{report['skipped']:,} skipped",
+                    end="",
+                    file=sys.stderr,
+                )
+
+            with open(args.path, "rb") as f:
+                report = import_rows(
+                    db, args.table, read_rows(f, fmt), args.mode, args.on_error, args.chunk_rows, progress=show
+                )
+            print(file=sys.stderr)
+            for error in report["errors"]:
+                print(error, file=sys.stderr)
+            status = "partially applied" if report["partial"] else "aborted" if report["aborted"] else "done"
+            print(f"{status}: {report['rows_written']:,} rows written "
+                  f"({report['inserted']:,} inserted, {report['updated']:,} updated)")
+            if report["aborted"]:
+                sys.exit(1)
+        else:
+            with open(args.path, "wb") as f:
+                for block in export(db, args.table, fmt):
+                    f.write(block)
+            print(f"exported {args.table} to {args.path}")
+    except BulkImportError as e:
+        print(f"error: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
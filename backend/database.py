@@ -1,21 +1,133 @@
 """
-SQLAlchemy setup and Ingredient model for Holy Mole inventory.
-Stores dynamic data: ingredient stock levels.
+SQLAlchemy setup and models for Holy Mole inventory.
+Stores dynamic data: ingredient stock levels, menu items with revenue, and the
+recipe graph as an edge table. Each kitchen (location) is its own SQLite shard;
+sessions are routed to a shard by the `location` query parameter or X-Location header.
 """
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import declarative_base, sessionmaker
-from sqlalchemy import Column, Integer, String, Float
+import glob
+import os
+import re
+import threading
+import time
+from typing import Callable
+
+from fastapi import Depends, Header, HTTPException, Query
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, Computed, DateTime, Index, Integer, String, Float, UniqueConstraint
+
+from logic import MENU_CATEGORIES
+from metrics import instrument_engine
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./holymole.db"
+ASYNC_DATABASE_URL = "sqlite+aiosqlite:///./holymole.db"
+
+# The original single-kitchen database is the default location; other sites live in
+# SITES_DIR as holymole-<location>.db.
+DEFAULT_LOCATION = "main"
+SITES_DIR = "./sites"
+LOCATION_PATTERN = re.compile(r"^[a-z0-9][a-z0-9_-]{0,62}$")
+
+# Bounded connection pool shared by each engine: POOL_SIZE kept open, up to
+# POOL_MAX_OVERFLOW more under burst, callers wait POOL_TIMEOUT seconds after that.
+POOL_SIZE = 8
+POOL_MAX_OVERFLOW = 8
+POOL_TIMEOUT = 10
+
+# Shards other than the default are closed (both engines disposed) after this long
+# without a get_shard call; the next request reopens them.
+SHARD_IDLE_SECONDS = 600.0
+
+# SQLite tuning applied to every new connection. WAL lets readers run alongside the
+# single writer; synchronous=NORMAL is durable across app crashes in WAL mode; writers
+# wait up to busy_timeout ms for the lock instead of failing with "database is locked".
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "temp_store": "MEMORY",
+    "cache_size": -16000,
+}
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
+
+
+class Shard:
+    """Engines and session factories for one location's database. Sessions carry the location in `info`."""
+
+    __slots__ = ("location", "engine", "SessionLocal", "async_engine", "AsyncSessionLocal", "ready", "last_used")
+
+    def __init__(self, location: str, url: str, async_url: str):
+        self.location = location
+        self.engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False},
+            pool_size=POOL_SIZE,
+            max_overflow=POOL_MAX_OVERFLOW,
+            pool_timeout=POOL_TIMEOUT,
+        )
+        event.listen(self.engine, "connect", _apply_sqlite_pragmas)
+        instrument_engine(self.engine, location)
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine, info={"location": location})
+        self.async_engine = create_async_engine(
+            async_url,
+            pool_size=POOL_SIZE,
+            max_overflow=POOL_MAX_OVERFLOW,
+            pool_timeout=POOL_TIMEOUT,
+        )
+        event.listen(self.async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+        instrument_engine(self.async_engine.sync_engine, location)
+        self.AsyncSessionLocal = async_sessionmaker(
+            self.async_engine, autoflush=False, expire_on_commit=False, info={"location": location}
+        )
+        self.ready = False
+        self.last_used = time.monotonic()
+
+
+_default_shard = Shard(DEFAULT_LOCATION, SQLALCHEMY_DATABASE_URL, ASYNC_DATABASE_URL)
+engine = _default_shard.engine
+SessionLocal = _default_shard.SessionLocal
+async_engine = _default_shard.async_engine
+AsyncSessionLocal = _default_shard.AsyncSessionLocal
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False},
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
+def utcnow() -> datetime:
+    """Naive UTC timestamp, the form SQLite DATETIME columns store and compare."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def begin_write(db: Session) -> None:
+    """
+    Take the shard's write lock before reading rows that are about to be updated.
+    pysqlite only opens a transaction at the first INSERT/UPDATE, so without this another
+    writer can commit between the read and the write and the logged delta would be off.
+    Must be the first statement of the transaction that is not a plain SELECT.
+    """
+    db.execute(text("BEGIN IMMEDIATE"))
+
+
+def begin_read(db: Session) -> None:
+    """
+    Open a deferred transaction so the SELECTs that follow all read one WAL snapshot;
+    pysqlite starts no transaction for plain reads. End it with commit or rollback.
+    """
+    db.execute(text("BEGIN"))
+
+
+IS_CRITICAL_SQL = "quantity < par_level"
+DAYS_ON_HAND_SQL = "CASE WHEN daily_usage > 0 THEN quantity / daily_usage ELSE 999.0 END"
+
+
 class Ingredient(Base):
     __tablename__ = "ingredients"
 
@@ -27,23 +139,262 @@ class Ingredient(Base):
     unit_cost = Column(Float, nullable=False, default=0.0)
     par_level = Column(Float, nullable=False, default=0.0)
     daily_usage = Column(Float, nullable=False, default=0.0)
+    # Virtual generated columns backing the dashboard sort (critical first, then fewest
+    # days on hand); 999 days stands in for "no usage", as the old in-Python sort did.
+    is_critical = Column(Integer, Computed(IS_CRITICAL_SQL, persisted=False))
+    days_on_hand = Column(Float, Computed(DAYS_ON_HAND_SQL, persisted=False))
+    # State of the rolling usage estimator (see ledger.py); NULL until the first usage event.
+    usage_accumulator = Column(Float, nullable=True)
+    usage_updated_at = Column(DateTime, nullable=True)
+
+
+Index("ix_ingredients_risk_order", Ingredient.is_critical.desc(), Ingredient.days_on_hand, Ingredient.id)
+Index(
+    "ix_ingredients_category_risk_order",
+    Ingredient.category,
+    Ingredient.is_critical.desc(),
+    Ingredient.days_on_hand,
+    Ingredient.id,
+)
+
+
+class MenuItem(Base):
+    __tablename__ = "menu_items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False, unique=True, index=True)
+    revenue_per_hour = Column(Float, nullable=False, default=0.0)
+    # Menu section; NULL reads as logic.DEFAULT_MENU_CATEGORY.
+    category = Column(String, nullable=True)
+
+
+class RecipeEdge(Base):
+    """`parent` (menu item or sub-recipe) uses `quantity` of `child` per portion."""
+
+    __tablename__ = "recipe_edges"
+    __table_args__ = (UniqueConstraint("parent", "child", name="uq_recipe_edges_parent_child"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    parent = Column(String, nullable=False, index=True)
+    child = Column(String, nullable=False, index=True)
+    quantity = Column(Float, nullable=False, default=1.0)
+
+
+class InventoryVersion(Base):
+    """Single-row counter bumped in the same transaction as every stock write; keys cached inventory pages."""
+
+    __tablename__ = "inventory_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class GraphRevision(Base):
+    """Single-row counter bumped on every recipe/menu write; keys cached graph snapshots."""
+
+    __tablename__ = "graph_revision"
+
+    id = Column(Integer, primary_key=True)
+    revision = Column(Integer, nullable=False, default=0)
 
 
-def get_db():
-    """Dependency that yields a DB session."""
-    db = SessionLocal()
+class IdempotencyKey(Base):
+    """Client-supplied key of an applied stock-movement batch and the response it produced."""
+
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String, primary_key=True)
+    # Keys expire after main.IDEMPOTENCY_KEY_TTL; expired rows are deleted on the next batch.
+    created_at = Column(DateTime, nullable=False, default=utcnow, index=True)
+    response = Column(String, nullable=False)
+
+
+class StockMovement(Base):
+    """Append-only log of stock changes; one row per ingredient per write."""
+
+    __tablename__ = "stock_movements"
+    __table_args__ = (Index("ix_stock_movements_ingredient_id_id", "ingredient_id", "id"),)
+
+    id = Column(Integer, primary_key=True)
+    ingredient_id = Column(Integer, nullable=False)
+    occurred_at = Column(DateTime, nullable=False, index=True)
+    delta = Column(Float, nullable=False)
+    reason = Column(String, nullable=False)
+
+
+class StockSnapshot(Base):
+    """
+    Compacted quantity of every ingredient as of movement `movement_id`. Rows sharing a
+    movement_id form one snapshot; time-travel replays only movements after it.
+    """
+
+    __tablename__ = "stock_snapshots"
+    __table_args__ = (Index("ix_stock_snapshots_taken_at_movement_id", "taken_at", "movement_id"),)
+
+    id = Column(Integer, primary_key=True)
+    movement_id = Column(Integer, nullable=False, index=True)
+    taken_at = Column(DateTime, nullable=False)
+    ingredient_id = Column(Integer, nullable=False)
+    quantity = Column(Float, nullable=False)
+
+
+def _migrate_ingredients(conn) -> None:
+    """Add columns introduced after the ingredients table was first created."""
+    info = conn.execute(text("PRAGMA table_xinfo(ingredients)")).fetchall()
+    if not info:
+        return
+    columns = [row[1] for row in info]
+    if "daily_usage" not in columns:
+        conn.execute(text("ALTER TABLE ingredients ADD COLUMN daily_usage REAL NOT NULL DEFAULT 0"))
+    if "is_critical" not in columns:
+        conn.execute(text(f"ALTER TABLE ingredients ADD COLUMN is_critical INTEGER GENERATED ALWAYS AS ({IS_CRITICAL_SQL}) VIRTUAL"))
+    if "days_on_hand" not in columns:
+        conn.execute(text(f"ALTER TABLE ingredients ADD COLUMN days_on_hand FLOAT GENERATED ALWAYS AS ({DAYS_ON_HAND_SQL}) VIRTUAL"))
+    if "usage_accumulator" not in columns:
+        conn.execute(text("ALTER TABLE ingredients ADD COLUMN usage_accumulator FLOAT"))
+    if "usage_updated_at" not in columns:
+        conn.execute(text("ALTER TABLE ingredients ADD COLUMN usage_updated_at DATETIME"))
+
+
+def _migrate_menu_items(conn) -> None:
+    """Add menu_items.category, filling it in for the built-in menu."""
+    info = conn.execute(text("PRAGMA table_xinfo(menu_items)")).fetchall()
+    if not info or "category" in [row[1] for row in info]:
+        return
+    conn.execute(text("ALTER TABLE menu_items ADD COLUMN category VARCHAR"))
+    conn.execute(
+        text("UPDATE menu_items SET category = :category WHERE name = :name"),
+        [{"name": name, "category": category} for name, category in MENU_CATEGORIES.items()],
+    )
+
+
+def init_db(bind=engine):
+    """Create all tables, migrating older ingredients tables first so their indexes can be built."""
+    with bind.connect() as conn:
+        _migrate_ingredients(conn)
+        _migrate_menu_items(conn)
+        conn.commit()
+    Base.metadata.create_all(bind=bind)
+    # create_all skips indexes on tables that already existed.
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+
+
+# ----- Location routing -----
+
+class UnknownLocation(LookupError):
+    """No shard exists for the requested location."""
+
+
+_shard_lock = threading.Lock()
+_shards: dict[str, Shard] = {DEFAULT_LOCATION: _default_shard}
+_shard_initializers: list[Callable[[Session], None]] = []
+
+
+def on_shard_created(fn: Callable[[Session], None]) -> Callable[[Session], None]:
+    """Register `fn(db)` to run once whenever a shard is first opened (e.g. to seed its menu)."""
+    _shard_initializers.append(fn)
+    return fn
+
+
+def _shard_path(location: str) -> str:
+    return os.path.join(SITES_DIR, f"holymole-{location}.db")
+
+
+def list_locations() -> list[str]:
+    """Every location with a database on disk, default first."""
+    found = {
+        os.path.basename(path)[len("holymole-"):-len(".db")]
+        for path in glob.glob(os.path.join(SITES_DIR, "holymole-*.db"))
+    }
+    found.discard(DEFAULT_LOCATION)
+    return [DEFAULT_LOCATION, *sorted(loc for loc in found if LOCATION_PATTERN.match(loc))]
+
+
+def get_shard(location: str = DEFAULT_LOCATION, create: bool = False) -> Shard:
+    """
+    Return the shard for `location`, opening it (migrations, tables, initializers) on first
+    use. Unknown locations raise UnknownLocation unless `create` is set.
+    """
+    shard = _shards.get(location)
+    if shard is not None and shard.ready:
+        shard.last_used = time.monotonic()
+        return shard
+    if not LOCATION_PATTERN.match(location):
+        raise UnknownLocation(location)
+    with _shard_lock:
+        shard = _shards.get(location)
+        if shard is None:
+            path = _shard_path(location)
+            if not create and not os.path.exists(path):
+                raise UnknownLocation(location)
+            os.makedirs(SITES_DIR, exist_ok=True)
+            shard = Shard(location, f"sqlite:///{path}", f"sqlite+aiosqlite:///{path}")
+            _shards[location] = shard
+        if not shard.ready:
+            init_db(shard.engine)
+            db = shard.SessionLocal()
+            try:
+                for fn in _shard_initializers:
+                    fn(db)
+            finally:
+                db.close()
+            shard.ready = True
+        shard.last_used = time.monotonic()
+        return shard
+
+
+async def evict_idle_shards(now: float | None = None) -> list[str]:
+    """
+    Close shards unused for SHARD_IDLE_SECONDS, disposing their sync and aiosqlite pools.
+    Sessions still open on an evicted shard keep working; their connections close when
+    returned. Returns the evicted locations.
+    """
+    if now is None:
+        now = time.monotonic()
+    with _shard_lock:
+        idle = [
+            loc for loc, shard in _shards.items()
+            if loc != DEFAULT_LOCATION and now - shard.last_used > SHARD_IDLE_SECONDS
+        ]
+        evicted = [_shards.pop(loc) for loc in idle]
+    for shard in evicted:
+        shard.engine.dispose()
+        await shard.async_engine.dispose()
+    return idle
+
+
+def session_location(db: Session | AsyncSession) -> str:
+    return db.info.get("location", DEFAULT_LOCATION)
+
+
+def get_location(
+    location: str | None = Query(default=None),
+    x_location: str | None = Header(default=None),
+) -> str:
+    """Dependency: the requested location (query parameter wins over the X-Location header)."""
+    return (location or x_location or DEFAULT_LOCATION).strip().lower()
+
+
+def route_location(location: str) -> Shard:
+    """get_shard for request handlers: unknown locations become a 404."""
+    try:
+        return get_shard(location)
+    except UnknownLocation:
+        raise HTTPException(status_code=404, detail=f"Location '{location}' not found.")
+
+
+def get_db(location: str = Depends(get_location)):
+    """Dependency that yields a DB session for the requested location."""
+    db = route_location(location).SessionLocal()
     try:
         yield db
     finally:
         db.close()
 
 
-def init_db():
-    """Create all tables and add daily_usage column if missing (migration)."""
-    Base.metadata.create_all(bind=engine)
-    with engine.connect() as conn:
-        info = conn.execute(text("PRAGMA table_info(ingredients)")).fetchall()
-        columns = [row[1] for row in info]
-        if "daily_usage" not in columns:
-            conn.execute(text("ALTER TABLE ingredients ADD COLUMN daily_usage REAL NOT NULL DEFAULT 0"))
-        conn.commit()
+async def get_async_db(location: str = Depends(get_location)):
+    """Dependency that yields an async DB session (aiosqlite) for the requested location."""
+    async with route_location(location).AsyncSessionLocal() as db:
+        yield db
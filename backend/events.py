@@ -0,0 +1,79 @@
+"""
+In-process broadcaster for Holy Mole inventory events.
+Stock writes publish a small delta once; the payload is serialized a single time and
+fanned out to every connected /stream client (kitchen tablets) through per-client
+bounded queues. Safe to publish from sync handlers running in the threadpool.
+"""
+import asyncio
+import json
+import threading
+from typing import Any
+
+# Events buffered per client before it is considered too slow and told to resync.
+MAX_PENDING_EVENTS = 256
+
+RESYNC = "event: resync\ndata: {}\n\n"
+
+
+def format_sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class Subscriber:
+    __slots__ = ("loop", "queue")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=MAX_PENDING_EVENTS)
+
+
+class Broadcaster:
+    """Subscribers are grouped by channel (the kitchen location); publishes go to one channel."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels: dict[str, set[Subscriber]] = {}
+
+    def subscriber_count(self, channel: str) -> int:
+        return len(self._channels.get(channel, ()))
+
+    def subscribe(self, channel: str) -> Subscriber:
+        sub = Subscriber(asyncio.get_running_loop())
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, channel: str, sub: Subscriber) -> None:
+        with self._lock:
+            subscribers = self._channels.get(channel)
+            if subscribers is not None:
+                subscribers.discard(sub)
+                if not subscribers:
+                    del self._channels[channel]
+
+    def publish(self, channel: str, event: str, data: Any) -> None:
+        """Serialize once and hand the message to the event loop of every subscriber on `channel`."""
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        if not subscribers:
+            return
+        message = format_sse(event, data)
+        for sub in subscribers:
+            try:
+                sub.loop.call_soon_threadsafe(_deliver, sub.queue, message)
+            except RuntimeError:
+                # Loop already closed; the stream's finally block will unsubscribe it.
+                pass
+
+
+def _deliver(queue: asyncio.Queue, message: str) -> None:
+    try:
+        queue.put_nowait(message)
+    except asyncio.QueueFull:
+        # Client fell behind: drop its backlog and ask it to reload the snapshot.
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(RESYNC)
+
+
+broadcaster = Broadcaster()
@@ -0,0 +1,226 @@
+"""
+Database-backed recipe graph for Holy Mole.
+Menu items and recipe edges live in each location's SQLite shard; blast radius runs
+either against an in-memory CompiledGraph snapshot keyed by location and stored graph
+revision, or directly in SQL as a recursive CTE over the indexed edge table.
+"""
+import threading
+import time
+from typing import Any
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from availability import discard_availability_engine
+from database import GraphRevision, MenuItem, RecipeEdge, session_location
+from metrics import record_traversal
+from logic import (
+    DEFAULT_MENU_CATEGORY,
+    MENU_CATEGORIES,
+    MENU_GRAPH,
+    REVENUE_IMPACT,
+    SUB_RECIPE_GRAPH,
+    CompiledGraph,
+    _empty_blast_radius,
+    recipe_quantity,
+)
+from risk import discard_risk_matrix
+from stock import discard_bill_of_materials
+
+
+def seed_default_graph(db: Session) -> bool:
+    """Load the built-in Tex-Mex menu into the graph tables if they are empty."""
+    if db.query(MenuItem.id).first() is not None:
+        return False
+    db.add_all(
+        MenuItem(name=name, revenue_per_hour=REVENUE_IMPACT.get(name, 0.0), category=MENU_CATEGORIES.get(name))
+        for name in MENU_GRAPH
+    )
+    db.add_all(
+        RecipeEdge(parent=parent, child=child, quantity=recipe_quantity(parent, child))
+        for graph in (MENU_GRAPH, SUB_RECIPE_GRAPH)
+        for parent, deps in graph.items()
+        for child in dict.fromkeys(deps)
+    )
+    bump_revision(db)
+    db.commit()
+    return True
+
+
+def get_revision(db: Session) -> int:
+    revision = db.query(GraphRevision.revision).filter(GraphRevision.id == 1).scalar()
+    return revision or 0
+
+
+def bump_revision(db: Session) -> int:
+    """Increment the stored graph revision (within the caller's transaction)."""
+    row = db.get(GraphRevision, 1)
+    if row is None:
+        row = GraphRevision(id=1, revision=0)
+        db.add(row)
+    row.revision += 1
+    db.flush()
+    return row.revision
+
+
+def _load_graph(db: Session, revision: int) -> CompiledGraph:
+    menu_graph: dict[str, list[str]] = {}
+    revenue: dict[str, float] = {}
+    for name, revenue_per_hour in db.query(MenuItem.name, MenuItem.revenue_per_hour).order_by(MenuItem.id):
+        menu_graph[name] = []
+        revenue[name] = revenue_per_hour
+    sub_recipe_graph: dict[str, list[str]] = {}
+    quantities: dict[str, dict[str, float]] = {}
+    edges = db.query(RecipeEdge.parent, RecipeEdge.child, RecipeEdge.quantity).order_by(RecipeEdge.id)
+    for parent, child, quantity in edges:
+        target = menu_graph if parent in menu_graph else sub_recipe_graph
+        target.setdefault(parent, []).append(child)
+        quantities.setdefault(parent, {})[child] = quantity
+    return CompiledGraph(menu_graph, sub_recipe_graph, revenue, revision, quantities=quantities)
+
+
+# Compiled graphs are kept per location and dropped after this long without a lookup.
+GRAPH_IDLE_SECONDS = 600.0
+_SWEEP_INTERVAL_SECONDS = 60.0
+
+_snapshot_lock = threading.Lock()
+_snapshots: dict[str, CompiledGraph] = {}
+_last_used: dict[str, float] = {}
+_last_sweep = 0.0
+
+
+def _discard_derived(graph: CompiledGraph) -> None:
+    discard_risk_matrix(graph)
+    discard_availability_engine(graph)
+    discard_bill_of_materials(graph)
+
+
+def evict_idle_graphs(now: float | None = None) -> list[str]:
+    """Drop compiled graphs (and what was derived from them) for locations idle too long."""
+    global _last_sweep
+    if now is None:
+        now = time.monotonic()
+    with _snapshot_lock:
+        _last_sweep = now
+        idle = [loc for loc, used in _last_used.items() if now - used > GRAPH_IDLE_SECONDS]
+        evicted = [_snapshots.pop(loc) for loc in idle if loc in _snapshots]
+        for loc in idle:
+            del _last_used[loc]
+    for graph in evicted:
+        _discard_derived(graph)
+    return idle
+
+
+def cached_locations() -> list[str]:
+    return sorted(_snapshots)
+
+
+def load_compiled_graph(db: Session) -> CompiledGraph:
+    """
+    Return the compiled graph for the session's location at its stored revision. Costs
+    one single-row query while the revision is unchanged; the edge table is only read
+    after a write. Graphs load lazily per location and are evicted when idle.
+    """
+    location = session_location(db)
+    now = time.monotonic()
+    if now - _last_sweep > _SWEEP_INTERVAL_SECONDS:
+        evict_idle_graphs(now)
+    revision = get_revision(db)
+    _last_used[location] = now
+    snapshot = _snapshots.get(location)
+    if snapshot is not None and snapshot.revision == revision:
+        return snapshot
+    # Load outside the lock: under AsyncSession.run_sync the queries yield to the event
+    # loop, and a blocking lock held across that would stall every other request.
+    loaded = _load_graph(db, revision)
+    with _snapshot_lock:
+        _last_used[location] = now
+        current = _snapshots.get(location)
+        replaced = None
+        if current is None or current.revision < revision:
+            replaced, _snapshots[location], current = current, loaded, loaded
+    if replaced is not None:
+        _discard_derived(replaced)
+    return current if current.revision == revision else loaded
+
+
+def creates_cycle(graph: CompiledGraph, parent: str, child: str) -> bool:
+    """True if adding `parent` -> `child` would make `child` (transitively) depend on itself."""
+    if parent.casefold() == child.casefold():
+        return True
+    pid = graph.resolve(parent)
+    cid = graph.resolve(child)
+    if pid is None or cid is None:
+        return False
+    return cid in graph.reach(pid)
+
+
+_AFFECTED_SQL = text(
+    """
+    WITH RECURSIVE affected(name) AS (
+        SELECT :name
+        UNION
+        SELECT e.parent FROM recipe_edges e JOIN affected a ON e.child = a.name
+    )
+    SELECT a.name,
+           m.revenue_per_hour,
+           m.id IS NOT NULL AS is_menu,
+           EXISTS (SELECT 1 FROM recipe_edges s WHERE s.parent = a.name) AS has_children
+    FROM affected a LEFT JOIN menu_items m ON m.name = a.name
+    """
+)
+
+_EDGES_SQL = text(
+    """
+    WITH RECURSIVE affected(name) AS (
+        SELECT :name
+        UNION
+        SELECT e.parent FROM recipe_edges e JOIN affected a ON e.child = a.name
+    )
+    SELECT e.child, e.parent FROM recipe_edges e JOIN affected a ON e.child = a.name
+    ORDER BY e.id
+    """
+)
+
+
+def menu_categories(db: Session) -> dict[str, str]:
+    """Menu item -> category, with uncategorized items under DEFAULT_MENU_CATEGORY."""
+    return {
+        name: category or DEFAULT_MENU_CATEGORY
+        for name, category in db.query(MenuItem.name, MenuItem.category)
+    }
+
+
+def blast_radius_sql(db: Session, ingredient_name: str) -> dict[str, Any]:
+    """
+    Same payload as logic.calculate_blast_radius, computed by a recursive CTE in SQLite.
+    The name is resolved through the compiled graph's casefolded index, so both sources
+    agree on which node a name means (SQLite's NOCASE folds ASCII only).
+    """
+    ingredient_name = ingredient_name.strip()
+    total_menu_count = db.query(MenuItem.id).count()
+    graph = load_compiled_graph(db)
+    nid = graph.resolve(ingredient_name) if ingredient_name else None
+    if nid is None:
+        return _empty_blast_radius(ingredient_name, total_menu_count)
+    key = graph.names[nid]
+
+    nodes = []
+    affected_with_revenue = []
+    for name, revenue_per_hour, is_menu, has_children in db.execute(_AFFECTED_SQL, {"name": key}):
+        node_type = "menu_item" if is_menu else "sub_recipe" if has_children else "ingredient"
+        nodes.append({"id": name, "label": name, "type": node_type})
+        if is_menu:
+            affected_with_revenue.append({"menu_item": name, "revenue_per_hour": revenue_per_hour})
+    edges = [{"from": child, "to": parent} for child, parent in db.execute(_EDGES_SQL, {"name": key})]
+    record_traversal("sql", len(nodes), len(edges))
+
+    return {
+        "ingredient": key,
+        "nodes": nodes,
+        "edges": edges,
+        "affected_menu_items": [a["menu_item"] for a in affected_with_revenue],
+        "affected_with_revenue": affected_with_revenue,
+        "total_menu_count": total_menu_count,
+        "total_revenue_risk_per_hour": round(sum(a["revenue_per_hour"] for a in affected_with_revenue), 2),
+    }
@@ -0,0 +1,188 @@
+"""
+Append-only stock ledger for Holy Mole.
+Every stock write appends one movement per changed ingredient. Every
+SNAPSHOT_EVERY_MOVEMENTS movements the whole inventory is compacted into a snapshot,
+so "quantity as of T" is the nearest snapshot plus a bounded replay. Consumption
+movements also feed a rolling usage estimator that keeps `daily_usage` current.
+"""
+import math
+from datetime import datetime
+from typing import Iterable
+
+from sqlalchemy import DateTime, Integer, func, insert, literal, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from database import Ingredient, InventoryVersion, StockMovement, StockSnapshot, on_shard_created, utcnow
+
+# Take a full snapshot once this many movements have been logged since the last one;
+# this is also the upper bound on rows replayed by a time-travel query.
+SNAPSHOT_EVERY_MOVEMENTS = 2000
+
+# Time constant of the exponentially decayed usage estimator, in days. An event's
+# weight halves roughly every 0.7 * USAGE_WINDOW_DAYS.
+USAGE_WINDOW_DAYS = 7.0
+
+# Movement reasons that represent consumption and therefore feed daily_usage. Only real
+# POS sales count; /simulate-rush is a random demo shock and must not skew the estimate
+# the planner, risk and Monte Carlo rely on.
+CONSUMPTION_REASONS = frozenset({"pos"})
+
+_movement_table = StockMovement.__table__
+_snapshot_table = StockSnapshot.__table__
+_version_table = InventoryVersion.__table__
+_BUMP_INVENTORY_VERSION = (
+    sqlite_insert(_version_table)
+    .values(id=1, version=1)
+    .on_conflict_do_update(index_elements=["id"], set_={"version": _version_table.c.version + 1})
+)
+
+
+def inventory_version(db: Session) -> int:
+    """Stored inventory version; response cache keys include it so any writer invalidates them."""
+    return db.scalar(select(InventoryVersion.version).where(InventoryVersion.id == 1)) or 0
+
+
+def bump_inventory_version(db: Session) -> None:
+    """Increment the inventory version in the caller's transaction (any process, API or CLI)."""
+    db.execute(_BUMP_INVENTORY_VERSION)
+
+
+def update_usage_estimate(ingredient: Ingredient, used: float, now: datetime) -> None:
+    """
+    Fold `used` units consumed at `now` into the ingredient's decayed usage total and
+    refresh daily_usage from it. O(1) per event; the first event seeds the total from
+    the existing daily_usage so estimates start from the configured value.
+    """
+    tau = USAGE_WINDOW_DAYS
+    if ingredient.usage_accumulator is None or ingredient.usage_updated_at is None:
+        accumulator = ingredient.daily_usage * tau
+    else:
+        elapsed_days = max(0.0, (now - ingredient.usage_updated_at).total_seconds() / 86400.0)
+        accumulator = ingredient.usage_accumulator * math.exp(-elapsed_days / tau)
+    accumulator += used
+    ingredient.usage_accumulator = accumulator
+    ingredient.usage_updated_at = now
+    ingredient.daily_usage = round(accumulator / tau, 4)
+
+
+def record_movements(
+    db: Session,
+    changes: Iterable[tuple[Ingredient, float, float]],
+    reason: str,
+    now: datetime | None = None,
+) -> int:
+    """
+    Log (ingredient, old_quantity, new_quantity) changes in the caller's transaction.
+    Unchanged rows are skipped. Returns the number of movements written.
+    """
+    if now is None:
+        now = utcnow()
+    rows = []
+    consumes = reason in CONSUMPTION_REASONS
+    for ingredient, old_quantity, new_quantity in changes:
+        delta = new_quantity - old_quantity
+        if delta == 0:
+            continue
+        rows.append({"ingredient_id": ingredient.id, "occurred_at": now, "delta": delta, "reason": reason})
+        if consumes and delta < 0:
+            update_usage_estimate(ingredient, -delta, now)
+    _append(db, rows, now)
+    return len(rows)
+
+
+def record_deltas(db: Session, deltas: dict[int, float], reason: str, now: datetime | None = None) -> int:
+    """
+    Log quantity changes by ingredient id, for bulk paths that write rows with core
+    statements instead of ORM objects. Does not feed the usage estimator.
+    """
+    if now is None:
+        now = utcnow()
+    rows = [
+        {"ingredient_id": ingredient_id, "occurred_at": now, "delta": delta, "reason": reason}
+        for ingredient_id, delta in deltas.items()
+        if delta != 0
+    ]
+    _append(db, rows, now)
+    return len(rows)
+
+
+def _append(db: Session, rows: list[dict], now: datetime) -> None:
+    if rows:
+        db.execute(insert(_movement_table), rows)
+        bump_inventory_version(db)
+        maybe_snapshot(db, now)
+
+
+def take_snapshot(db: Session, now: datetime | None = None) -> int:
+    """Compact current quantities into a snapshot at the latest movement id."""
+    if now is None:
+        now = utcnow()
+    db.flush()
+    movement_id = db.scalar(select(func.coalesce(func.max(StockMovement.id), 0)))
+    db.execute(
+        insert(_snapshot_table).from_select(
+            ["movement_id", "taken_at", "ingredient_id", "quantity"],
+            select(literal(movement_id, Integer), literal(now, DateTime), Ingredient.id, Ingredient.quantity),
+        )
+    )
+    return movement_id
+
+
+def maybe_snapshot(db: Session, now: datetime) -> None:
+    last = db.scalar(select(func.coalesce(func.max(StockSnapshot.movement_id), 0)))
+    latest = db.scalar(select(func.coalesce(func.max(StockMovement.id), 0)))
+    if latest - last >= SNAPSHOT_EVERY_MOVEMENTS:
+        take_snapshot(db, now)
+
+
+def reset_ledger(db: Session) -> None:
+    """Drop all history (used when the inventory is wiped) and snapshot the new baseline."""
+    db.query(StockMovement).delete()
+    db.query(StockSnapshot).delete()
+    bump_inventory_version(db)
+    take_snapshot(db)
+
+
+@on_shard_created
+def ensure_baseline_snapshot(db: Session) -> None:
+    """
+    Snapshot stock that predates the ledger (a database from before it existed, never
+    reseeded), so as-of replays start from real quantities instead of zero.
+    """
+    if db.scalar(select(StockSnapshot.id).limit(1)) is None and db.scalar(select(Ingredient.id).limit(1)) is not None:
+        take_snapshot(db)
+        db.commit()
+
+
+def quantities_as_of(db: Session, at: datetime, ingredient_id: int | None = None) -> dict[int, float]:
+    """
+    Quantity of every ingredient (or one) as of `at`: the newest snapshot taken at or
+    before `at`, plus the movements logged after it up to `at`. The replay is bounded by
+    the next snapshot, so it never scans more than ~SNAPSHOT_EVERY_MOVEMENTS rows.
+    """
+    base_id = db.scalar(
+        select(StockSnapshot.movement_id)
+        .where(StockSnapshot.taken_at <= at)
+        .order_by(StockSnapshot.taken_at.desc(), StockSnapshot.movement_id.desc())
+        .limit(1)
+    )
+    next_id = db.scalar(select(func.min(StockSnapshot.movement_id)).where(StockSnapshot.taken_at > at))
+    quantities: dict[int, float] = {}
+    if base_id is not None:
+        snap = select(StockSnapshot.ingredient_id, StockSnapshot.quantity).where(StockSnapshot.movement_id == base_id)
+        if ingredient_id is not None:
+            snap = snap.where(StockSnapshot.ingredient_id == ingredient_id)
+        quantities = dict(db.execute(snap).all())
+    replay = (
+        select(StockMovement.ingredient_id, func.sum(StockMovement.delta))
+        .where(StockMovement.id > (base_id or 0), StockMovement.occurred_at <= at)
+        .group_by(StockMovement.ingredient_id)
+    )
+    if next_id is not None:
+        replay = replay.where(StockMovement.id <= next_id)
+    if ingredient_id is not None:
+        replay = replay.where(StockMovement.ingredient_id == ingredient_id)
+    for iid, delta in db.execute(replay):
+        quantities[iid] = round(quantities.get(iid, 0.0) + delta, 4)
+    return quantities
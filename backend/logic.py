@@ -1,8 +1,14 @@
 """
-Static data and blast-radius logic for Holy Mole.
-Menu dependencies (with optional sub-recipe layer), revenue impact; DFS-based blast radius.
+Default menu data and blast-radius logic for Holy Mole (the defaults seed the graph tables).
+Menu dependencies (with optional sub-recipe layer), revenue impact; blast radius over a compiled, revision-keyed graph index.
 """
-from typing import Any
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Callable, Generic, TypeVar
+
+from metrics import GRAPH_BUILD_SECONDS, record_traversal
 
 # Sub-recipe -> list of ingredients (or nested sub-recipes) for 3-level depth
 # e.g. Sandwich -> Spicy Mayo -> Mayo -> Eggs
@@ -58,6 +64,25 @@ MENU_GRAPH: dict[str, list[str]] = {
     "Michelada": ["Beer", "Lime", "Hot Sauce", "Clamato"],
 }
 
+# Menu Item -> menu section, used to collapse large blast radii by category.
+DEFAULT_MENU_CATEGORY = "Uncategorized"
+MENU_CATEGORIES: dict[str, str] = {
+    **dict.fromkeys(["Spicy Chicken Sandwich", "Steak Sandwich"], "Sandwiches & Burgers"),
+    **dict.fromkeys(
+        ["Fish Taco", "Steak Tacos", "Chicken Tacos", "Carnitas Tacos", "Shrimp Tacos", "Chorizo Tacos", "Baja Fish Tacos"],
+        "Tacos",
+    ),
+    **dict.fromkeys(
+        ["Carnitas Burrito", "Breakfast Burrito", "Vegetarian Burrito", "Guacamole Bowl", "Bowl with Steak", "Chipotle-Style Bowl"],
+        "Burritos & Bowls",
+    ),
+    **dict.fromkeys(["Quesadilla", "Veggie Quesadilla", "Mole Enchiladas"], "Quesadillas & More"),
+    **dict.fromkeys(["Ceviche", "Shrimp Ceviche", "Fish Ceviche"], "Seafood"),
+    **dict.fromkeys(["Huevos Rancheros", "Chilaquiles", "Breakfast Tacos", "Huevos con Chorizo"], "Breakfast"),
+    **dict.fromkeys(["Guac and Chips", "Elote", "Street Corn Salad", "Queso Fundido", "Sopes"], "Apps & Sides"),
+    **dict.fromkeys(["Margarita", "Paloma", "Mango Margarita", "Pineapple Margarita", "Michelada"], "Drinks"),
+}
+
 # Menu Item -> hourly revenue loss if unavailable ($)
 REVENUE_IMPACT: dict[str, float] = {
     "Spicy Chicken Sandwich": 150.0,
@@ -98,97 +123,329 @@ REVENUE_IMPACT: dict[str, float] = {
 }
 
 
-def _build_reverse_graph() -> dict[str, list[str]]:
-    """Build reverse graph: node -> list of nodes that depend on it (menu items or sub-recipes)."""
-    rev: dict[str, list[str]] = {}
-    for menu_item, deps in MENU_GRAPH.items():
-        for node in deps:
-            rev.setdefault(node, []).append(menu_item)
-    for sub_recipe, deps in SUB_RECIPE_GRAPH.items():
-        for node in deps:
-            rev.setdefault(node, []).append(sub_recipe)
-    return rev
+# Default amount of an ingredient (in its stock unit) used per portion of whatever
+# depends on it. Edges not listed here or in RECIPE_QUANTITIES use 1 unit.
+PORTION_QUANTITIES: dict[str, float] = {
+    "Avocados": 0.5,
+    "Lime": 0.5,
+    "Cilantro": 0.05,
+    "Onion": 0.15,
+    "Tomato": 0.25,
+    "Jalapeño": 0.25,
+    "Bell Pepper": 0.25,
+    "Corn": 1.0,
+    "Lettuce": 0.1,
+    "Cabbage": 0.08,
+    "Cucumber": 0.25,
+    "Mango": 0.5,
+    "Pineapple": 0.15,
+    "Steak": 0.33,
+    "Chicken": 0.33,
+    "Fish": 0.33,
+    "Shrimp": 0.25,
+    "Chorizo": 0.2,
+    "Pork": 0.33,
+    "Bacon": 0.15,
+    "Eggs": 2.0,
+    "Cheese": 0.1,
+    "Crema": 0.03,
+    "Tortilla": 3.0,
+    "Bun": 1.0,
+    "Rice": 0.2,
+    "Black Beans": 0.15,
+    "Chips": 0.25,
+    "Flour": 0.15,
+    "Potato": 0.25,
+    "Chili Powder": 0.01,
+    "Salsa": 0.06,
+    "Mole Sauce": 0.1,
+    "Hot Sauce": 0.02,
+    "Tequila": 0.06,
+    "Triple Sec": 0.04,
+    "Grapefruit Soda": 0.5,
+    "Beer": 0.042,
+    "Clamato": 0.12,
+    "Mayo": 0.06,
+    "Spicy Mayo": 0.06,
+}
+
+# Parent (menu item or sub-recipe) -> ingredient -> quantity per portion, where it
+# differs from PORTION_QUANTITIES. Sub-recipe quantities are per unit of the sub-recipe
+# (e.g. per quart of Spicy Mayo).
+RECIPE_QUANTITIES: dict[str, dict[str, float]] = {
+    "Spicy Mayo": {"Mayo": 0.9, "Jalapeño": 4.0},
+    "Mayo": {"Eggs": 4.0, "Oil": 0.75},
+    "Carnitas Burrito": {"Tortilla": 1.0},
+    "Breakfast Burrito": {"Tortilla": 1.0, "Eggs": 3.0},
+    "Vegetarian Burrito": {"Tortilla": 1.0},
+    "Quesadilla": {"Tortilla": 2.0},
+    "Veggie Quesadilla": {"Tortilla": 2.0},
+    "Huevos Rancheros": {"Tortilla": 2.0},
+    "Chilaquiles": {"Tortilla": 4.0},
+    "Queso Fundido": {"Tortilla": 4.0, "Cheese": 0.25},
+    "Mole Enchiladas": {"Tortilla": 3.0},
+    "Margarita": {"Lime": 1.0},
+    "Mango Margarita": {"Lime": 1.0},
+    "Pineapple Margarita": {"Lime": 1.0},
+    "Guac and Chips": {"Avocados": 2.0},
+    "Guacamole Bowl": {"Avocados": 2.0},
+}
 
 
-def _node_type(name: str) -> str:
-    if name in MENU_GRAPH:
-        return "menu_item"
-    if name in SUB_RECIPE_GRAPH:
-        return "sub_recipe"
-    return "ingredient"
+def recipe_quantity(parent: str, child: str) -> float:
+    """Quantity of `child` used per portion (or per unit) of `parent`."""
+    override = RECIPE_QUANTITIES.get(parent)
+    if override is not None and child in override:
+        return override[child]
+    return PORTION_QUANTITIES.get(child, 1.0)
 
 
-def calculate_blast_radius(ingredient_name: str) -> dict[str, Any]:
+def _recipe_quantity_table() -> dict[str, dict[str, float]]:
+    return {
+        parent: {child: recipe_quantity(parent, child) for child in deps}
+        for graph in (MENU_GRAPH, SUB_RECIPE_GRAPH)
+        for parent, deps in graph.items()
+    }
+
+
+class CompiledGraph:
     """
-    DFS from the given ingredient UP to all affected menu items (and sub-recipes).
+    Immutable, integer-indexed view of the recipe graph for one graph revision.
+    Node names map to ids through a casefolded index; the reverse adjacency and the
+    transitive closure (node -> every node it feeds, itself first, in DFS order) are
+    stored CSR-style so a blast-radius lookup is a dict hit plus slices. Each reverse
+    edge also carries the per-portion quantity of its source consumed by its target.
+    """
+
+    __slots__ = (
+        "revision",
+        "names",
+        "kinds",
+        "revenue",
+        "name_index",
+        "rev_offsets",
+        "rev_targets",
+        "rev_quantities",
+        "reach_offsets",
+        "reach_targets",
+        "affected_offsets",
+        "affected_targets",
+        "risk",
+        "menu_count",
+    )
+
+    def __init__(
+        self,
+        menu_graph: dict[str, list[str]],
+        sub_recipe_graph: dict[str, list[str]],
+        revenue_impact: dict[str, float],
+        revision: int = 0,
+        quantities: dict[str, dict[str, float]] | None = None,
+    ):
+        started = time.perf_counter()
+        self.revision = revision
+        self.menu_count = len(menu_graph)
+
+        names: list[str] = []
+        ids: dict[str, int] = {}
+
+        def node_id(name: str) -> int:
+            nid = ids.get(name)
+            if nid is None:
+                nid = ids[name] = len(names)
+                names.append(name)
+            return nid
+
+        for menu_item in menu_graph:
+            node_id(menu_item)
+        for sub_recipe in sub_recipe_graph:
+            node_id(sub_recipe)
+
+        # Reverse adjacency, grouped by source id; menu edges first, then sub-recipe
+        # edges, each in recipe order.
+        if quantities is None:
+            quantities = {}
+        dependents: list[list[tuple[int, float]]] = []
+        for parents in (menu_graph, sub_recipe_graph):
+            for parent, deps in parents.items():
+                pid = ids[parent]
+                parent_quantities = quantities.get(parent, {})
+                # A child listed twice is one edge, not two.
+                for dep in dict.fromkeys(deps):
+                    did = node_id(dep)
+                    while len(dependents) <= did:
+                        dependents.append([])
+                    dependents[did].append((pid, parent_quantities.get(dep, 1.0)))
+        while len(dependents) < len(names):
+            dependents.append([])
+
+        n = len(names)
+        self.names = names
+        self.kinds = [
+            "menu_item" if name in menu_graph else "sub_recipe" if name in sub_recipe_graph else "ingredient"
+            for name in names
+        ]
+        self.revenue = [revenue_impact.get(name, 0.0) if name in menu_graph else 0.0 for name in names]
+
+        # First spelling wins on casefold collisions, like the old linear scan.
+        name_index: dict[str, int] = {}
+        for nid, name in enumerate(names):
+            name_index.setdefault(name.casefold(), nid)
+        self.name_index = name_index
+
+        rev_offsets = array("l", [0]) * (n + 1)
+        rev_targets = array("l")
+        rev_quantities = array("d")
+        for nid in range(n):
+            for pid, qty in dependents[nid]:
+                rev_targets.append(pid)
+                rev_quantities.append(qty)
+            rev_offsets[nid + 1] = len(rev_targets)
+        self.rev_offsets = rev_offsets
+        self.rev_targets = rev_targets
+        self.rev_quantities = rev_quantities
+
+        reach_offsets = array("l", [0]) * (n + 1)
+        reach_targets = array("l")
+        affected_offsets = array("l", [0]) * (n + 1)
+        affected_targets = array("l")
+        risk = array("d", [0.0]) * n
+        is_menu = [kind == "menu_item" for kind in self.kinds]
+        seen = [-1] * n
+        for root in range(n):
+            total = 0.0
+            stack = [root]
+            while stack:
+                node = stack.pop()
+                if seen[node] == root:
+                    continue
+                seen[node] = root
+                reach_targets.append(node)
+                if is_menu[node]:
+                    affected_targets.append(node)
+                    total += self.revenue[node]
+                for i in range(rev_offsets[node], rev_offsets[node + 1]):
+                    dep = rev_targets[i]
+                    if seen[dep] != root:
+                        stack.append(dep)
+            reach_offsets[root + 1] = len(reach_targets)
+            affected_offsets[root + 1] = len(affected_targets)
+            risk[root] = total
+        self.reach_offsets = reach_offsets
+        self.reach_targets = reach_targets
+        self.affected_offsets = affected_offsets
+        self.affected_targets = affected_targets
+        self.risk = risk
+        GRAPH_BUILD_SECONDS.observe(time.perf_counter() - started)
+
+    def resolve(self, name: str) -> int | None:
+        """Return the node id for a (case-insensitive) name, or None."""
+        return self.name_index.get(name.strip().casefold())
+
+    def reach(self, nid: int) -> array:
+        return self.reach_targets[self.reach_offsets[nid]:self.reach_offsets[nid + 1]]
+
+    def affected(self, nid: int) -> array:
+        return self.affected_targets[self.affected_offsets[nid]:self.affected_offsets[nid + 1]]
+
+    def dependents(self, nid: int) -> array:
+        return self.rev_targets[self.rev_offsets[nid]:self.rev_offsets[nid + 1]]
+
+
+# Caches derived from a compiled graph (risk matrix, availability, bill of materials)
+# hold at most this many graphs, dropping the oldest first.
+MAX_CACHED_GRAPHS = 64
+
+T = TypeVar("T")
+
+
+class GraphCache(Generic[T]):
+    """
+    Values derived from a compiled graph, keyed by id(graph) and bounded by
+    MAX_CACHED_GRAPHS. `build(graph, *args)` runs at most once per graph and args; an
+    entry only matches the graph object it was built from, so a reused id never hits.
+    """
+
+    def __init__(self, build: Callable[..., T]):
+        self._build = build
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[int, tuple[CompiledGraph, tuple, T]] = OrderedDict()
+
+    def get(self, graph: CompiledGraph, *args) -> T:
+        entry = self._entries.get(id(graph))
+        if entry is not None and entry[0] is graph and entry[1] == args:
+            return entry[2]
+        with self._lock:
+            entry = self._entries.get(id(graph))
+            if entry is None or entry[0] is not graph or entry[1] != args:
+                entry = self._entries[id(graph)] = (graph, args, self._build(graph, *args))
+                while len(self._entries) > MAX_CACHED_GRAPHS:
+                    self._entries.popitem(last=False)
+            return entry[2]
+
+    def discard(self, graph: CompiledGraph) -> None:
+        with self._lock:
+            entry = self._entries.get(id(graph))
+            if entry is not None and entry[0] is graph:
+                del self._entries[id(graph)]
+
+
+def compile_builtin_graph() -> CompiledGraph:
+    """
+    Compile the built-in menu constants. The API serves each location's graph from its
+    shard (graph_store.load_compiled_graph); this is for scripts and benchmarks.
+    """
+    return CompiledGraph(MENU_GRAPH, SUB_RECIPE_GRAPH, REVENUE_IMPACT, quantities=_recipe_quantity_table())
+
+
+def _empty_blast_radius(ingredient_name: str, total_menu_count: int) -> dict[str, Any]:
+    return {
+        "ingredient": ingredient_name,
+        "nodes": [],
+        "edges": [],
+        "affected_menu_items": [],
+        "affected_with_revenue": [],
+        "total_menu_count": total_menu_count,
+        "total_revenue_risk_per_hour": 0.0,
+    }
+
+
+def calculate_blast_radius(ingredient_name: str, graph: CompiledGraph) -> dict[str, Any]:
+    """
+    Walk from the given ingredient UP to all affected menu items (and sub-recipes).
     Returns nodes (with type), edges, and total revenue at risk.
+    Uses the precomputed closure of the compiled graph instead of a per-call DFS.
     """
-    rev = _build_reverse_graph()
     ingredient_name = ingredient_name.strip()
     if not ingredient_name:
-        return {
-            "ingredient": ingredient_name,
-            "nodes": [],
-            "edges": [],
-            "affected_menu_items": [],
-            "affected_with_revenue": [],
-            "total_menu_count": len(MENU_GRAPH),
-            "total_revenue_risk_per_hour": 0.0,
-        }
-
-    # Normalize key lookup
-    key = next((k for k in rev if k.lower() == ingredient_name.lower()), None)
-    if key is None:
-        # Also check if it's a sub-recipe or menu item (e.g. user typed "Mayo")
-        key = next(
-            (k for k in (list(MENU_GRAPH) + list(SUB_RECIPE_GRAPH)) if k.lower() == ingredient_name.lower()),
-            None,
-        )
-        if key is None:
-            return {
-                "ingredient": ingredient_name,
-                "nodes": [],
-                "edges": [],
-                "affected_menu_items": [],
-                "affected_with_revenue": [],
-                "total_menu_count": len(MENU_GRAPH),
-                "total_revenue_risk_per_hour": 0.0,
-            }
-
-    visited: set[str] = set()
-    stack = [key]
+        return _empty_blast_radius(ingredient_name, graph.menu_count)
+
+    nid = graph.resolve(ingredient_name)
+    if nid is None:
+        return _empty_blast_radius(ingredient_name, graph.menu_count)
+
+    names = graph.names
+    kinds = graph.kinds
+    revenue = graph.revenue
+    reach = graph.reach(nid)
+    affected = [names[m] for m in graph.affected(nid)]
+
     edges: list[dict[str, str]] = []
-    while stack:
-        node = stack.pop()
-        if node in visited:
-            continue
-        visited.add(node)
-        for dependent in rev.get(node, []):
-            edges.append({"from": node, "to": dependent})
-            if dependent not in visited:
-                stack.append(dependent)
-
-    # Affected menu items = reachable menu-item nodes
-    menu_items_set = set(MENU_GRAPH)
-    affected = [n for n in visited if n in menu_items_set]
-    total_risk = sum(REVENUE_IMPACT.get(m, 0.0) for m in affected)
-    total_menu_count = len(MENU_GRAPH)
-    affected_with_revenue = [
-        {"menu_item": m, "revenue_per_hour": REVENUE_IMPACT.get(m, 0.0)}
-        for m in affected
-    ]
-
-    nodes = [
-        {"id": n, "label": n, "type": _node_type(n)}
-        for n in visited
-    ]
+    rev_offsets = graph.rev_offsets
+    rev_targets = graph.rev_targets
+    for node in reach:
+        for i in range(rev_offsets[node], rev_offsets[node + 1]):
+            edges.append({"from": names[node], "to": names[rev_targets[i]]})
+    record_traversal("snapshot", len(reach), len(edges))
 
     return {
-        "ingredient": key,
-        "nodes": nodes,
+        "ingredient": names[nid],
+        "nodes": [{"id": names[n], "label": names[n], "type": kinds[n]} for n in reach],
         "edges": edges,
         "affected_menu_items": affected,
-        "affected_with_revenue": affected_with_revenue,
-        "total_menu_count": total_menu_count,
-        "total_revenue_risk_per_hour": round(total_risk, 2),
+        "affected_with_revenue": [
+            {"menu_item": names[m], "revenue_per_hour": revenue[m]} for m in graph.affected(nid)
+        ],
+        "total_menu_count": graph.menu_count,
+        "total_revenue_risk_per_hour": round(graph.risk[nid], 2),
     }
@@ -1,13 +1,65 @@
 """
-Holy Mole API: inventory, seed, blast-radius, and simulate-rush endpoints.
+Holy Mole API: inventory, seed, blast-radius, recipe graph, simulate-rush, and stream endpoints.
+Every endpoint is scoped to one kitchen via `?location=` or the X-Location header
+(default "main"); /fleet endpoints aggregate across all locations.
 """
+import asyncio
+import base64
+import json
 import random
-from fastapi import FastAPI, Depends
+import tempfile
+from datetime import datetime, timedelta, timezone
+from typing import BinaryIO
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from sqlalchemy import and_, insert, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from database import get_db, init_db, SessionLocal, Ingredient
+from database import (
+    DEFAULT_LOCATION,
+    IdempotencyKey,
+    Ingredient,
+    MenuItem,
+    RecipeEdge,
+    begin_read,
+    begin_write,
+    evict_idle_shards,
+    get_async_db,
+    get_db,
+    get_location,
+    get_shard,
+    list_locations,
+    on_shard_created,
+    route_location,
+    session_location,
+    utcnow,
+)
+from availability import get_availability_engine
+from bulk import FORMATS, BulkImportError, TABLES, export, import_rows, read_rows
+from cache import CachedResponse, etag_matches, response_cache, serialize
+from events import broadcaster, format_sse
+from metrics import MetricsMiddleware, PROFILING_ENABLED, get_profile, list_profiles, render_metrics
+from ledger import inventory_version, quantities_as_of, record_movements, reset_ledger
+from graph_store import (
+    blast_radius_sql,
+    bump_revision,
+    creates_cycle,
+    get_revision,
+    load_compiled_graph,
+    menu_categories,
+    seed_default_graph,
+)
+from blast_view import GROUP_BY, PAYLOAD_FORMATS, columnar_blast_radius, prune_blast_radius
 from logic import calculate_blast_radius
+from risk import get_risk_matrix, risk_table, scenario_risk
+from planner import DEFAULT_HORIZON_HOURS, DEFAULT_LEAD_TIME_HOURS, StockLine, plan_reorder
+from simulation import build_inputs, run_scenarios_async, summarize
+from stock import MovementError, aggregate_depletion, apply_depletion, parse_movement
 
 app = FastAPI(title="Holy Mole API", version="0.1.0")
 
@@ -17,7 +69,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-Cache", "X-Profile-Id"],
 )
+app.add_middleware(MetricsMiddleware)
 
 # ----- Seed data for Tex-Mex ingredients -----
 SEED_INGREDIENTS = [
@@ -75,73 +129,500 @@ SEED_INGREDIENTS = [
 ]
 
 
+# Every new location starts with the built-in menu.
+on_shard_created(seed_default_graph)
+
+
+# How often idle location shards are looked for and closed.
+SHARD_SWEEP_SECONDS = 60.0
+
+
+async def _sweep_idle_shards():
+    while True:
+        await asyncio.sleep(SHARD_SWEEP_SECONDS)
+        await evict_idle_shards()
+
+
 @app.on_event("startup")
-def startup():
-    init_db()
+async def startup():
+    get_shard(DEFAULT_LOCATION)
+    app.state.shard_sweeper = asyncio.create_task(_sweep_idle_shards())
 
 
-@app.get("/inventory")
-def get_inventory(db: Session = Depends(get_db)):
-    """Return all ingredients from the database, sorted with out-of-stock items first."""
-    ingredients = db.query(Ingredient).all()
-    
-    # Sort: critical items (below par) first, then by days on hand
-    def sort_key(i):
-        is_critical = i.quantity < i.par_level
-        days_on_hand = i.quantity / i.daily_usage if i.daily_usage > 0 else 999.0
-        return (
-            not is_critical,  # False (critical) comes before True (non-critical)
-            days_on_hand,     # Lower days on hand first
+@app.on_event("shutdown")
+async def shutdown():
+    app.state.shard_sweeper.cancel()
+
+
+def _ingredient_dict(i: Ingredient) -> dict:
+    return {
+        "id": i.id,
+        "name": i.name,
+        "category": i.category,
+        "quantity": i.quantity,
+        "unit": i.unit,
+        "par_level": i.par_level,
+        "daily_usage": i.daily_usage,
+    }
+
+
+INVENTORY_COLUMNS = (
+    Ingredient.id,
+    Ingredient.name,
+    Ingredient.category,
+    Ingredient.quantity,
+    Ingredient.unit,
+    Ingredient.par_level,
+    Ingredient.daily_usage,
+)
+INVENTORY_KEYS = tuple(c.key for c in INVENTORY_COLUMNS)
+
+
+def _encode_cursor(is_critical: int, days_on_hand: float, ingredient_id: int) -> str:
+    raw = json.dumps([is_critical, days_on_hand, ingredient_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[int, float, int]:
+    try:
+        is_critical, days_on_hand, ingredient_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return int(is_critical), float(days_on_hand), int(ingredient_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+
+def _inventory_query(category: str | None = None, cursor: str | None = None, limit: int | None = None):
+    """
+    Column-only inventory select ordered by the indexed generated columns: critical
+    (below par) first, then fewest days on hand, then id. Paging is keyset on that order.
+    """
+    stmt = select(*INVENTORY_COLUMNS, Ingredient.is_critical, Ingredient.days_on_hand).order_by(
+        Ingredient.is_critical.desc(), Ingredient.days_on_hand, Ingredient.id
+    )
+    if category is not None:
+        stmt = stmt.where(Ingredient.category == category)
+    if cursor is not None:
+        is_critical, days_on_hand, ingredient_id = _decode_cursor(cursor)
+        stmt = stmt.where(
+            or_(
+                Ingredient.is_critical < is_critical,
+                and_(
+                    Ingredient.is_critical == is_critical,
+                    or_(
+                        Ingredient.days_on_hand > days_on_hand,
+                        and_(Ingredient.days_on_hand == days_on_hand, Ingredient.id > ingredient_id),
+                    ),
+                ),
+            )
         )
-    
-    sorted_ingredients = sorted(ingredients, key=sort_key)
-    
-    return [
+    if limit is not None:
+        # One extra row tells us whether another page exists.
+        stmt = stmt.limit(limit + 1)
+    return stmt
+
+
+def _inventory_page(rows, limit: int | None) -> tuple[list[dict], str | None]:
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = _encode_cursor(last.is_critical, last.days_on_hand, last.id)
+    return [dict(zip(INVENTORY_KEYS, row)) for row in rows], next_cursor
+
+
+def _inventory_rows(db: Session) -> list[dict]:
+    return _inventory_page(db.execute(_inventory_query()).all(), None)[0]
+
+
+def _cached_response(entry: CachedResponse, hit: bool, if_none_match: str | None) -> Response:
+    """Serve a cached body, or 304 when the client already holds this ETag."""
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache", "X-Cache": "HIT" if hit else "MISS", **entry.headers}
+    if etag_matches(if_none_match, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+@app.get("/inventory")
+async def get_inventory(
+    category: str | None = None,
+    cursor: str | None = None,
+    limit: int | None = Query(default=None, ge=1, le=1000),
+    if_none_match: str | None = Header(default=None),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Return ingredients sorted with out-of-stock items first. Pass `limit` to page; the
+    next page's `cursor` comes back in the X-Next-Cursor header. Responses carry an
+    ETag and are served from cache until the next stock write.
+    """
+    location = session_location(db)
+    # Read the version and the rows from one snapshot, so a page is never cached under a
+    # version whose data it does not contain.
+    await db.run_sync(begin_read)
+    try:
+        key = ("inventory", location, await db.run_sync(inventory_version), category, cursor, limit)
+        entry = response_cache.get(key)
+        hit = entry is not None
+        if entry is None:
+            rows = (await db.execute(_inventory_query(category, cursor, limit))).all()
+    finally:
+        await db.rollback()
+    if entry is None:
+        items, next_cursor = _inventory_page(rows, limit)
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor is not None else None
+        entry = response_cache.put(key, CachedResponse(serialize(items), headers))
+    return _cached_response(entry, hit, if_none_match)
+
+
+def _critical_names(db: Session) -> set[str]:
+    return {
+        name for name, quantity, par_level in db.query(Ingredient.name, Ingredient.quantity, Ingredient.par_level)
+        if quantity < par_level
+    }
+
+
+def _revenue_at_risk(db: Session, critical: set[str]) -> float:
+    """Revenue lost per hour if every below-par ingredient ran out."""
+    if not critical:
+        return 0.0
+    return scenario_risk([sorted(critical)], get_risk_matrix(load_compiled_graph(db)))[0]
+
+
+def _publish_stock_change(db: Session, changed: list[Ingredient], previous: dict[str, float]) -> None:
+    """
+    Push the changed ingredients and the resulting move in revenue-at-risk to /stream
+    clients. `previous` maps each changed name to its quantity before the write.
+    """
+    location = session_location(db)
+    if broadcaster.subscriber_count(location) == 0:
+        return
+    critical_after = _critical_names(db)
+    critical_before = set(critical_after)
+    for ing in changed:
+        if previous.get(ing.name, ing.quantity) < ing.par_level:
+            critical_before.add(ing.name)
+        else:
+            critical_before.discard(ing.name)
+    after = _revenue_at_risk(db, critical_after)
+    before = after if critical_before == critical_after else _revenue_at_risk(db, critical_before)
+    broadcaster.publish(
+        location,
+        "inventory_delta",
         {
-            "id": i.id,
-            "name": i.name,
-            "category": i.category,
-            "quantity": i.quantity,
-            "unit": i.unit,
-            "par_level": i.par_level,
-            "daily_usage": i.daily_usage,
-        }
-        for i in sorted_ingredients
-    ]
+            "changed": [_ingredient_dict(i) for i in changed],
+            "revenue_at_risk_per_hour": after,
+            "revenue_at_risk_delta": round(after - before, 2),
+        },
+    )
+
+
+def _inventory_snapshot(location: str) -> dict:
+    db = get_shard(location).SessionLocal()
+    try:
+        return {"ingredients": _inventory_rows(db), "revenue_at_risk_per_hour": _revenue_at_risk(db, _critical_names(db))}
+    finally:
+        db.close()
+
+
+# Seconds between SSE comment lines that keep idle proxies from closing the stream.
+STREAM_KEEPALIVE_SECONDS = 15.0
+
+
+@app.get("/stream")
+async def stream(request: Request, location: str = Depends(get_location)):
+    """
+    Server-sent events: one `snapshot` of the inventory, then `inventory_delta` events
+    with only the changed ingredients. A `resync` event means reconnect for a fresh snapshot.
+    """
+    route_location(location)
+    sub = broadcaster.subscribe(location)
+
+    async def events():
+        try:
+            yield format_sse("snapshot", await run_in_threadpool(_inventory_snapshot, location))
+            while not await request.is_disconnected():
+                try:
+                    message = await asyncio.wait_for(sub.queue.get(), STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield message
+        finally:
+            broadcaster.unsubscribe(location, sub)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/inventory/as-of")
+def inventory_as_of(at: datetime, ingredient: str | None = None, db: Session = Depends(get_db)):
+    """Return ingredient quantities as they were at time `at` (ISO 8601, UTC)."""
+    if at.tzinfo is not None:
+        at = at.astimezone(timezone.utc).replace(tzinfo=None)
+    ingredient_id = None
+    if ingredient is not None:
+        ingredient_id = db.query(Ingredient.id).filter(Ingredient.name.ilike(ingredient)).scalar()
+        if ingredient_id is None:
+            raise HTTPException(status_code=404, detail=f"Ingredient '{ingredient}' not found.")
+    quantities = quantities_as_of(db, at, ingredient_id)
+    names = dict(db.query(Ingredient.id, Ingredient.name).filter(Ingredient.id.in_(quantities)))
+    return {
+        "at": at.isoformat(),
+        "ingredients": [
+            {"id": iid, "name": names.get(iid), "quantity": round(quantity, 2)}
+            for iid, quantity in sorted(quantities.items())
+        ],
+    }
 
 
 @app.post("/seed")
 def seed_db(db: Session = Depends(get_db)):
     """Wipe and reseed the database with Tex-Mex ingredients."""
     db.query(Ingredient).delete()
+    db.execute(insert(Ingredient.__table__), SEED_INGREDIENTS)
+    reset_ledger(db)
     db.commit()
-    for data in SEED_INGREDIENTS:
-        ing = Ingredient(**data)
-        db.add(ing)
-    db.commit()
+    location = session_location(db)
+    if broadcaster.subscriber_count(location):
+        broadcaster.publish(location, "snapshot", _inventory_snapshot(location))
     return {"status": "ok", "message": "Database reseeded with Tex-Mex ingredients."}
 
 
 @app.get("/blast-radius/{ingredient_name:path}")
-def blast_radius(ingredient_name: str):
-    """Return dependency graph and revenue risk for the given ingredient."""
-    return calculate_blast_radius(ingredient_name)
+def blast_radius(
+    ingredient_name: str,
+    source: str = "snapshot",
+    max_depth: int | None = Query(default=None, ge=1),
+    top_k: int | None = Query(default=None, ge=1),
+    group_by: str | None = None,
+    fmt: str = Query(default="full", alias="format"),
+    if_none_match: str | None = Header(default=None),
+    db: Session = Depends(get_db),
+):
+    """
+    Return dependency graph and revenue risk for the given ingredient.
+    `source=sql` walks the edge table with a recursive CTE instead of the cached snapshot.
+    For large graphs, `max_depth`, `top_k` (menu items by revenue) and `group_by=category`
+    prune what is drawn, collapsing hidden menu items into group nodes; `format=compact`
+    returns columnar arrays with integer edge pairs. Responses are cached per graph
+    revision and carry an ETag.
+    """
+    if group_by is not None and group_by not in GROUP_BY:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of {', '.join(GROUP_BY)}.")
+    if fmt not in PAYLOAD_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(PAYLOAD_FORMATS)}.")
+    source = "sql" if source == "sql" else "snapshot"
+    key = (
+        "blast-radius",
+        session_location(db),
+        source,
+        ingredient_name.strip().casefold(),
+        get_revision(db),
+        max_depth,
+        top_k,
+        group_by,
+        fmt,
+    )
+    entry = response_cache.get(key)
+    hit = entry is not None
+    if entry is None:
+        if source == "sql":
+            payload = blast_radius_sql(db, ingredient_name)
+        else:
+            payload = calculate_blast_radius(ingredient_name, graph=load_compiled_graph(db))
+        if max_depth is not None or top_k is not None or group_by is not None:
+            categories = menu_categories(db) if group_by == "category" else None
+            payload = prune_blast_radius(payload, max_depth, top_k, group_by, categories)
+        if fmt == "compact":
+            payload = columnar_blast_radius(payload)
+        entry = response_cache.put(key, CachedResponse(serialize(payload)))
+    return _cached_response(entry, hit, if_none_match)
+
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus text exposition of request, DB and graph metrics."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/debug/profiles")
+def debug_profiles():
+    """Recent per-request profiles (requests sent with ?profile=1 while HOLYMOLE_PROFILING=1)."""
+    return {"enabled": PROFILING_ENABLED, "profiles": list_profiles()}
+
+
+@app.get("/debug/profiles/{profile_id}")
+def debug_profile(profile_id: int):
+    """Collapsed stacks (flamegraph input) sampled while one request ran."""
+    profile = get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found.")
+    return profile
+
+
+@app.get("/cache/stats")
+def cache_stats(db: Session = Depends(get_db)):
+    """Hit/miss counters and size of the response cache."""
+    return {**response_cache.stats(), "inventory_version": inventory_version(db)}
+
+
+@app.get("/availability")
+def availability(db: Session = Depends(get_db)):
+    """Return portions remaining and the limiting ingredient for every menu item."""
+    engine = get_availability_engine(load_compiled_graph(db))
+    engine.sync({name: quantity for name, quantity in db.query(Ingredient.name, Ingredient.quantity)})
+    return engine.menu_availability()
+
+
+@app.get("/risk-matrix")
+def risk_matrix(db: Session = Depends(get_db)):
+    """Return revenue at risk for every ingredient, computed in one sparse matrix product."""
+    return risk_table(get_risk_matrix(load_compiled_graph(db)))
+
+
+class StockoutScenarios(BaseModel):
+    scenarios: list[list[str]]
+
+
+@app.post("/risk-matrix/scenarios")
+def risk_matrix_scenarios(body: StockoutScenarios, db: Session = Depends(get_db)):
+    """Return revenue at risk for each hypothetical set of stocked-out ingredients."""
+    matrix = get_risk_matrix(load_compiled_graph(db))
+    return {"revenue_risk_per_hour": scenario_risk(body.scenarios, matrix)}
+
+
+# ----- Recipe graph CRUD -----
+
+class MenuItemIn(BaseModel):
+    name: str
+    revenue_per_hour: float = 0.0
+    category: str | None = None
+
+
+class RecipeEdgeIn(BaseModel):
+    parent: str
+    child: str
+    quantity: float = 1.0
+
+
+def _menu_item_dict(m: MenuItem) -> dict:
+    return {"id": m.id, "name": m.name, "revenue_per_hour": m.revenue_per_hour, "category": m.category}
+
+
+def _edge_dict(e: RecipeEdge) -> dict:
+    return {"id": e.id, "parent": e.parent, "child": e.child, "quantity": e.quantity}
+
+
+@app.get("/menu-items")
+def list_menu_items(db: Session = Depends(get_db)):
+    return [_menu_item_dict(m) for m in db.query(MenuItem).order_by(MenuItem.id)]
+
+
+@app.post("/menu-items")
+def create_menu_item(body: MenuItemIn, db: Session = Depends(get_db)):
+    name = body.name.strip()
+    if db.query(MenuItem.id).filter(MenuItem.name == name).first() is not None:
+        raise HTTPException(status_code=409, detail=f"Menu item '{name}' already exists.")
+    item = MenuItem(name=name, revenue_per_hour=body.revenue_per_hour, category=body.category)
+    db.add(item)
+    bump_revision(db)
+    db.commit()
+    return _menu_item_dict(item)
+
+
+@app.put("/menu-items/{name:path}")
+def update_menu_item(name: str, body: MenuItemIn, db: Session = Depends(get_db)):
+    item = db.query(MenuItem).filter(MenuItem.name == name).first()
+    if item is None:
+        raise HTTPException(status_code=404, detail=f"Menu item '{name}' not found.")
+    new_name = body.name.strip()
+    if new_name != item.name:
+        if db.query(MenuItem.id).filter(MenuItem.name == new_name).first() is not None:
+            raise HTTPException(status_code=409, detail=f"Menu item '{new_name}' already exists.")
+        db.query(RecipeEdge).filter(RecipeEdge.parent == item.name).update({RecipeEdge.parent: new_name})
+        item.name = new_name
+    item.revenue_per_hour = body.revenue_per_hour
+    item.category = body.category
+    bump_revision(db)
+    db.commit()
+    return _menu_item_dict(item)
+
+
+@app.delete("/menu-items/{name:path}")
+def delete_menu_item(name: str, db: Session = Depends(get_db)):
+    item = db.query(MenuItem).filter(MenuItem.name == name).first()
+    if item is None:
+        raise HTTPException(status_code=404, detail=f"Menu item '{name}' not found.")
+    db.query(RecipeEdge).filter(RecipeEdge.parent == item.name).delete()
+    db.delete(item)
+    bump_revision(db)
+    db.commit()
+    return {"status": "ok", "message": f"Deleted menu item {name}."}
+
+
+@app.get("/recipe-edges")
+def list_recipe_edges(parent: str | None = None, child: str | None = None, db: Session = Depends(get_db)):
+    query = db.query(RecipeEdge)
+    if parent is not None:
+        query = query.filter(RecipeEdge.parent == parent)
+    if child is not None:
+        query = query.filter(RecipeEdge.child == child)
+    return [_edge_dict(e) for e in query.order_by(RecipeEdge.id)]
+
+
+@app.post("/recipe-edges")
+def create_recipe_edge(body: RecipeEdgeIn, db: Session = Depends(get_db)):
+    parent, child = body.parent.strip(), body.child.strip()
+    if creates_cycle(load_compiled_graph(db), parent, child):
+        raise HTTPException(status_code=400, detail=f"'{parent}' -> '{child}' would create a cycle.")
+    edge = db.query(RecipeEdge).filter(RecipeEdge.parent == parent, RecipeEdge.child == child).first()
+    if edge is None:
+        edge = RecipeEdge(parent=parent, child=child)
+        db.add(edge)
+    edge.quantity = body.quantity
+    bump_revision(db)
+    db.commit()
+    return _edge_dict(edge)
+
+
+@app.delete("/recipe-edges/{edge_id}")
+def delete_recipe_edge(edge_id: int, db: Session = Depends(get_db)):
+    edge = db.get(RecipeEdge, edge_id)
+    if edge is None:
+        raise HTTPException(status_code=404, detail=f"Recipe edge {edge_id} not found.")
+    db.delete(edge)
+    bump_revision(db)
+    db.commit()
+    return {"status": "ok", "message": f"Deleted recipe edge {edge_id}."}
 
 
 @app.post("/simulate-rush")
-def simulate_rush(db: Session = Depends(get_db)):
+async def simulate_rush(db: AsyncSession = Depends(get_async_db)):
     """Randomly lower stock of random items to simulate a dinner rush."""
-    ingredients = db.query(Ingredient).all()
+    await db.run_sync(begin_write)
+    ingredients = (await db.scalars(select(Ingredient))).all()
     if not ingredients:
+        await db.rollback()
         return {"status": "ok", "message": "No ingredients to simulate."}
     # Pick 1–3 random ingredients and reduce quantity by 10–40%
     n = min(random.randint(1, 3), len(ingredients))
     chosen = random.sample(ingredients, n)
-    for ing in chosen:
-        pct = random.uniform(0.10, 0.40)
-        new_qty = max(0.0, ing.quantity * (1 - pct))
-        ing.quantity = round(new_qty, 2)
-    db.commit()
+    previous = {ing.name: ing.quantity for ing in chosen}
+    used = {ing.id: ing.quantity * random.uniform(0.10, 0.40) for ing in chosen}
+    # Relative update, so the logged delta is exactly what the UPDATE removed.
+    await db.run_sync(apply_depletion, used)
+    chosen = (
+        await db.scalars(
+            select(Ingredient).where(Ingredient.id.in_(used)).execution_options(populate_existing=True)
+        )
+    ).all()
+    changes = [(ing, previous[ing.name], ing.quantity) for ing in chosen]
+    await db.run_sync(record_movements, changes, "rush")
+    await db.commit()
+    await db.run_sync(_publish_stock_change, chosen, previous)
     return {
         "status": "ok",
         "message": "Rush simulated.",
@@ -149,16 +630,101 @@ def simulate_rush(db: Session = Depends(get_db)):
     }
 
 
+class RushSimulation(BaseModel):
+    scenarios: int = Field(default=10_000, ge=1, le=1_000_000)
+    hours: float = Field(default=4.0, gt=0, le=24)
+    rush_multiplier: float = Field(default=2.5, gt=0)
+    seed: int | None = None
+    workers: int | None = Field(default=None, ge=1)
+
+
+def _rush_inputs(location: str, body: RushSimulation):
+    db = get_shard(location).SessionLocal()
+    try:
+        matrix = get_risk_matrix(load_compiled_graph(db))
+        stock = {
+            name: (quantity, daily_usage)
+            for name, quantity, daily_usage in db.query(Ingredient.name, Ingredient.quantity, Ingredient.daily_usage)
+        }
+    finally:
+        db.close()
+    return matrix, build_inputs(matrix, stock, hours=body.hours, rush_multiplier=body.rush_multiplier)
+
+
+@app.post("/simulate-rush/monte-carlo")
+async def simulate_rush_monte_carlo(body: RushSimulation, location: str = Depends(get_location)):
+    """
+    Run many simulated rushes against a copy of current stock (the database is not
+    modified) and return the distribution of time to first stockout and revenue lost.
+    `workers` is capped at the CPU count; chunks run in a shared process pool.
+    """
+    route_location(location)
+    matrix, inputs = await run_in_threadpool(_rush_inputs, location, body)
+    results = await run_scenarios_async(inputs, body.scenarios, seed=body.seed, workers=body.workers)
+    return summarize(matrix, inputs, results, body.seed)
+
+
+class ReorderPlanRequest(BaseModel):
+    budget: float = Field(ge=0)
+    lead_times: dict[str, float] = {}
+    default_lead_time_hours: float = Field(default=DEFAULT_LEAD_TIME_HOURS, ge=0)
+    horizon_hours: int = Field(default=DEFAULT_HORIZON_HOURS, ge=1, le=24 * 14)
+    dry_run: bool = False
+
+
+@app.post("/reorder-plan")
+def reorder_plan(body: ReorderPlanRequest, db: Session = Depends(get_db)):
+    """
+    Choose reorder quantities for every ingredient within `budget` to minimise expected
+    revenue at risk over the horizon, then apply the whole plan in one transaction
+    (unless `dry_run`).
+    """
+    ingredients = db.query(Ingredient).all()
+    lines = [
+        StockLine(i.id, i.name, i.quantity, i.daily_usage, i.unit_cost, i.unit) for i in ingredients
+    ]
+    plan = plan_reorder(
+        get_risk_matrix(load_compiled_graph(db)),
+        lines,
+        body.budget,
+        body.lead_times,
+        default_lead_time=body.default_lead_time_hours,
+        horizon_hours=body.horizon_hours,
+    )
+    if body.dry_run or not plan["orders"]:
+        return {"status": "ok", "applied": False, **plan}
+
+    # Orders are amounts to add; re-read the rows under the write lock before adding them.
+    begin_write(db)
+    changed = (
+        db.query(Ingredient)
+        .filter(Ingredient.id.in_([o["ingredient_id"] for o in plan["orders"]]))
+        .execution_options(populate_existing=True)
+        .all()
+    )
+    by_id = {i.id: i for i in changed}
+    previous = {i.name: i.quantity for i in changed}
+    for order in plan["orders"]:
+        ing = by_id[order["ingredient_id"]]
+        ing.quantity = round(ing.quantity + order["quantity"], 2)
+    record_movements(db, [(i, previous[i.name], i.quantity) for i in changed], "reorder")
+    db.commit()
+    _publish_stock_change(db, changed, previous)
+    return {"status": "ok", "applied": True, **plan}
+
+
 @app.post("/restock/{ingredient_name:path}")
-def restock_ingredient(ingredient_name: str, db: Session = Depends(get_db)):
+async def restock_ingredient(ingredient_name: str, db: AsyncSession = Depends(get_async_db)):
     """Restock a specific ingredient to 2x its par level."""
+    await db.run_sync(begin_write)
     # Find the ingredient by name (case-insensitive)
-    ingredient = db.query(Ingredient).filter(
-        Ingredient.name.ilike(ingredient_name)
-    ).first()
+    ingredient = await db.scalar(
+        select(Ingredient).where(Ingredient.name.ilike(ingredient_name)).limit(1)
+    )
     
     if not ingredient:
-        return {"status": "error", "message": f"Ingredient '{ingredient_name}' not found."}, 404
+        await db.rollback()
+        raise HTTPException(status_code=404, detail=f"Ingredient '{ingredient_name}' not found.")
     
     # Calculate restock details
     old_quantity = ingredient.quantity
@@ -168,7 +734,9 @@ def restock_ingredient(ingredient_name: str, db: Session = Depends(get_db)):
     
     # Update the quantity
     ingredient.quantity = round(new_quantity, 2)
-    db.commit()
+    await db.run_sync(record_movements, [(ingredient, old_quantity, ingredient.quantity)], "restock")
+    await db.commit()
+    await db.run_sync(_publish_stock_change, [ingredient], {ingredient.name: old_quantity})
     
     return {
         "status": "ok",
@@ -181,3 +749,290 @@ def restock_ingredient(ingredient_name: str, db: Session = Depends(get_db)):
         "unit_cost": ingredient.unit_cost,
         "total_cost": round(total_cost, 2),
     }
+
+
+# ----- POS stock movements -----
+
+# Largest number of events accepted in one /stock-movements request.
+MAX_MOVEMENTS_PER_BATCH = 200_000
+
+# Request bodies up to this size are spooled in memory, larger ones to a temp file.
+MOVEMENTS_SPOOL_BYTES = 8 * 1024 * 1024
+
+# How long an Idempotency-Key is remembered; a retry after that applies the batch again.
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+
+
+def _read_movements(body: BinaryIO) -> list[tuple[str, str, float]]:
+    """Parse a spooled NDJSON / JSON-lines body line by line; a JSON array body also works."""
+    movements: list[tuple[str, str, float]] = []
+    chunk = body.read(4096)
+    while chunk and not chunk.strip():
+        chunk = body.read(4096)
+    body.seek(0)
+    if chunk.lstrip().startswith(b"["):
+        try:
+            events = json.load(body)
+        except ValueError:
+            raise MovementError("invalid JSON array")
+        if len(events) > MAX_MOVEMENTS_PER_BATCH:
+            raise MovementError(f"batch exceeds {MAX_MOVEMENTS_PER_BATCH} events")
+        return [parse_movement(event, i) for i, event in enumerate(events, start=1)]
+    for line_no, line in enumerate(body, start=1):
+        if not line.strip():
+            continue
+        try:
+            event = json.loads(line)
+        except ValueError:
+            raise MovementError(f"line {line_no}: invalid JSON")
+        movements.append(parse_movement(event, line_no))
+        if len(movements) > MAX_MOVEMENTS_PER_BATCH:
+            raise MovementError(f"batch exceeds {MAX_MOVEMENTS_PER_BATCH} events")
+    return movements
+
+
+def _apply_stock_movements(db: Session, movements: list[tuple[str, str, float]], idempotency_key: str | None) -> dict:
+    begin_write(db)
+    totals, unknown = aggregate_depletion(db, load_compiled_graph(db), movements)
+    changed = db.query(Ingredient).filter(Ingredient.id.in_(totals)).all() if totals else []
+    previous = {i.name: i.quantity for i in changed}
+    apply_depletion(db, totals)
+    if changed:
+        changed = (
+            db.query(Ingredient)
+            .filter(Ingredient.id.in_(totals))
+            .execution_options(populate_existing=True)
+            .all()
+        )
+    record_movements(db, [(i, previous[i.name], i.quantity) for i in changed], "pos")
+    result = {
+        "status": "ok",
+        "events": len(movements),
+        "ingredients_updated": len(changed),
+        "unknown": unknown,
+        "updated": [
+            {"name": i.name, "quantity_used": round(totals[i.id], 4), "quantity": i.quantity} for i in changed
+        ],
+    }
+    # Expired keys go in the same transaction, before a reused one is stored again.
+    db.query(IdempotencyKey).filter(IdempotencyKey.created_at < utcnow() - IDEMPOTENCY_KEY_TTL).delete()
+    if idempotency_key:
+        db.add(IdempotencyKey(key=idempotency_key, response=json.dumps(result)))
+    db.commit()
+    _publish_stock_change(db, changed, previous)
+    return result
+
+
+def _replayed(db: Session, idempotency_key: str) -> dict | None:
+    stored = db.get(IdempotencyKey, idempotency_key)
+    if stored is None or stored.created_at < utcnow() - IDEMPOTENCY_KEY_TTL:
+        return None
+    return {**json.loads(stored.response), "replayed": True}
+
+
+def _run_stock_movements(location: str, body: BinaryIO, idempotency_key: str | None) -> dict:
+    db = get_shard(location).SessionLocal()
+    try:
+        if idempotency_key:
+            replayed = _replayed(db, idempotency_key)
+            if replayed is not None:
+                return replayed
+        movements = _read_movements(body)
+        try:
+            return _apply_stock_movements(db, movements, idempotency_key)
+        except IntegrityError:
+            # The same key was committed by a concurrent retry; ours rolled back.
+            db.rollback()
+            replayed = _replayed(db, idempotency_key) if idempotency_key else None
+            if replayed is None:
+                raise
+            return replayed
+    finally:
+        db.close()
+
+
+@app.post("/stock-movements")
+async def stock_movements(
+    request: Request,
+    idempotency_key: str | None = Header(default=None),
+    location: str = Depends(get_location),
+):
+    """
+    Apply a batch of POS sale / usage events (NDJSON, one object per line). Menu-item
+    sales are exploded through the recipe graph and everything lands in one UPDATE
+    transaction. Retrying with the same Idempotency-Key returns the original result.
+    The body is spooled first; parsing and the update run in the thread pool.
+    """
+    route_location(location)
+    with tempfile.SpooledTemporaryFile(max_size=MOVEMENTS_SPOOL_BYTES) as body:
+        async for chunk in request.stream():
+            body.write(chunk)
+        body.seek(0)
+        try:
+            return await run_in_threadpool(_run_stock_movements, location, body, idempotency_key)
+        except MovementError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+
+# ----- Locations and fleet -----
+
+# A site that has not answered the fleet rollup within this many seconds is reported
+# as timed out instead of holding up the whole response.
+FLEET_SITE_TIMEOUT_SECONDS = 5.0
+
+
+@app.get("/locations")
+def get_locations():
+    """List every location with a database."""
+    return {"default": DEFAULT_LOCATION, "locations": list_locations()}
+
+
+@app.post("/locations/{location}")
+def create_location(location: str):
+    """Create a location's database and load the built-in menu; POST /seed?location=... stocks it."""
+    location = location.strip().lower()
+    existed = location in list_locations()
+    try:
+        get_shard(location, create=True)
+    except LookupError:
+        raise HTTPException(status_code=400, detail="Location names are lowercase letters, digits, '-' or '_'.")
+    return {"status": "ok", "location": location, "created": not existed}
+
+
+def _site_revenue_at_risk(location: str) -> dict:
+    db = get_shard(location).SessionLocal()
+    try:
+        critical = _critical_names(db)
+        return {
+            "location": location,
+            "status": "ok",
+            "critical_ingredients": sorted(critical),
+            "revenue_at_risk_per_hour": _revenue_at_risk(db, critical),
+        }
+    finally:
+        db.close()
+
+
+@app.get("/fleet/revenue-at-risk")
+async def fleet_revenue_at_risk():
+    """
+    Revenue at risk per hour (every below-par ingredient running out) for every location
+    and in total. Sites are queried concurrently, each with its own timeout, so one slow
+    kitchen cannot hold up the rollup.
+    """
+
+    async def one(location: str) -> dict:
+        try:
+            return await asyncio.wait_for(
+                run_in_threadpool(_site_revenue_at_risk, location), FLEET_SITE_TIMEOUT_SECONDS
+            )
+        except asyncio.TimeoutError:
+            return {"location": location, "status": "timeout"}
+        except Exception as e:
+            return {"location": location, "status": "error", "detail": str(e)}
+
+    sites = await asyncio.gather(*(one(location) for location in list_locations()))
+    ok = [s for s in sites if s["status"] == "ok"]
+    return {
+        "locations": len(sites),
+        "reporting": len(ok),
+        "total_revenue_at_risk_per_hour": round(sum(s["revenue_at_risk_per_hour"] for s in ok), 2),
+        "sites": sorted(sites, key=lambda s: -s.get("revenue_at_risk_per_hour", 0.0)),
+    }
+
+
+# ----- Bulk import / export -----
+
+# Import bodies are spooled to memory up to this size, then to a temp file.
+IMPORT_SPOOL_BYTES = 8 * 1024 * 1024
+
+_EXPORT_MEDIA_TYPES = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+
+def _check_bulk_args(table: str, fmt: str) -> None:
+    if table not in TABLES:
+        raise HTTPException(status_code=404, detail=f"Unknown table '{table}'.")
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(FORMATS)}.")
+
+
+def _run_import(location: str, table: str, body, fmt: str, mode: str, on_error: str) -> dict:
+    db = get_shard(location).SessionLocal()
+    try:
+        report = import_rows(
+            db,
+            table,
+            read_rows(body, fmt),
+            mode,
+            on_error,
+            progress=lambda r: broadcaster.publish(location, "import_progress", r),
+        )
+        if report["rows_written"] or (mode == "replace" and not report["aborted"]):
+            if broadcaster.subscriber_count(location):
+                broadcaster.publish(location, "snapshot", _inventory_snapshot(location))
+        return report
+    finally:
+        db.close()
+
+
+@app.post("/import/{table}")
+async def import_table(
+    table: str,
+    request: Request,
+    fmt: str = Query(default="csv", alias="format"),
+    mode: str = "upsert",
+    on_error: str = "abort",
+    location: str = Depends(get_location),
+):
+    """
+    Bulk-load ingredients, menu_items or recipe_edges from a CSV or Parquet body. Rows
+    are validated and written in chunks; /stream clients get `import_progress` events
+    after each one. `upsert` (default) merges on the natural key and commits per chunk;
+    `mode=replace` swaps the whole table in one transaction. `on_error=skip` drops bad
+    rows instead of stopping. An abort with nothing written is a 400; an upsert that
+    aborts after committing earlier chunks returns 207 with status "partial".
+    """
+    _check_bulk_args(table, fmt)
+    route_location(location)
+    with tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_BYTES) as body:
+        async for chunk in request.stream():
+            body.write(chunk)
+        body.seek(0)
+        try:
+            report = await run_in_threadpool(_run_import, location, table, body, fmt, mode, on_error)
+        except BulkImportError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    if report["partial"]:
+        return JSONResponse(status_code=207, content={"status": "partial", **report})
+    if report["aborted"]:
+        raise HTTPException(status_code=400, detail=report)
+    return {"status": "ok", **report}
+
+
+@app.get("/export/{table}")
+def export_table(
+    table: str,
+    fmt: str = Query(default="csv", alias="format"),
+    location: str = Depends(get_location),
+):
+    """Stream ingredients, menu_items or recipe_edges as CSV or Parquet, chunk by chunk."""
+    _check_bulk_args(table, fmt)
+    route_location(location)
+    db = get_shard(location).SessionLocal()
+    try:
+        blocks = export(db, table, fmt)
+    except BulkImportError as e:
+        db.close()
+        raise HTTPException(status_code=400, detail=str(e))
+
+    def stream_blocks():
+        try:
+            yield from blocks
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        stream_blocks(),
+        media_type=_EXPORT_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{table}-{location}.{fmt}"'},
+    )
@@ -0,0 +1,317 @@
+"""
+Low-overhead instrumentation for Holy Mole, exposed in Prometheus text format.
+Counters and histograms are plain in-process objects (one lock each, bisect into fixed
+buckets), so they can stay on in production. MetricsMiddleware times every request by
+route template and counts the DB queries it issued; database.py feeds query timings
+from SQLAlchemy engine events and logic.py feeds graph traversal counters.
+
+Set HOLYMOLE_PROFILING=1 to allow `?profile=1` (or an X-Profile: 1 header) on any
+request: a background sampler records stacks while it runs and the collapsed result is
+kept for GET /debug/profiles/{id}. Sampling is process-wide, so a profile also shows
+whatever other requests were running at the same time.
+"""
+import asyncio
+import contextvars
+import itertools
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as _Tally, OrderedDict
+from typing import Iterable
+from urllib.parse import parse_qs
+
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last is +Inf), sum, count]
+        self._series: dict[tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, (list(s[0]), s[1], s[2])) for labels, s in self._series.items())
+        for labels, (counts, total, n) in items:
+            cumulative = 0
+            for bound, c in zip((*self.buckets, float("inf")), counts):
+                cumulative += c
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {n}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    "holymole_http_request_duration_seconds",
+    "Time to response headers per route template.",
+    ("method", "route", "status"),
+)
+REQUEST_DB_QUERIES = Histogram(
+    "holymole_http_request_db_queries",
+    "DB queries issued while serving one request.",
+    ("route",),
+    buckets=COUNT_BUCKETS,
+)
+DB_QUERY_SECONDS = Histogram("holymole_db_query_duration_seconds", "SQL statement execution time.", ("location",))
+BLAST_RADIUS_CALLS = Counter("holymole_blast_radius_calls_total", "Blast-radius computations.", ("source",))
+BLAST_RADIUS_NODES = Counter("holymole_blast_radius_nodes_visited_total", "Graph nodes visited by blast radius.", ("source",))
+BLAST_RADIUS_EDGES = Counter("holymole_blast_radius_edges_emitted_total", "Edges emitted in blast-radius payloads.", ("source",))
+GRAPH_BUILD_SECONDS = Histogram("holymole_graph_build_duration_seconds", "Time to compile a recipe graph snapshot.")
+
+REGISTRY = [
+    REQUEST_SECONDS,
+    REQUEST_DB_QUERIES,
+    DB_QUERY_SECONDS,
+    BLAST_RADIUS_CALLS,
+    BLAST_RADIUS_NODES,
+    BLAST_RADIUS_EDGES,
+    GRAPH_BUILD_SECONDS,
+]
+
+
+def render_metrics() -> str:
+    lines: list[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def record_traversal(source: str, nodes: int, edges: int) -> None:
+    BLAST_RADIUS_CALLS.inc(1, source)
+    BLAST_RADIUS_NODES.inc(nodes, source)
+    BLAST_RADIUS_EDGES.inc(edges, source)
+
+
+# ----- Per-request DB query accounting -----
+
+# One-element list holding the current request's query count; shared (not copied) with
+# threadpool workers and run_sync greenlets, which inherit the request's context.
+_request_queries: contextvars.ContextVar[list[int] | None] = contextvars.ContextVar("request_queries", default=None)
+
+
+def instrument_engine(engine, location: str) -> None:
+    """Attach query timing to a (sync) SQLAlchemy engine."""
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        context._holymole_started = time.perf_counter()
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        DB_QUERY_SECONDS.observe(time.perf_counter() - context._holymole_started, location)
+        queries = _request_queries.get()
+        if queries is not None:
+            queries[0] += 1
+
+    event.listen(engine, "before_cursor_execute", before)
+    event.listen(engine, "after_cursor_execute", after)
+
+
+# ----- Opt-in sampling profiler -----
+
+PROFILING_ENABLED = os.environ.get("HOLYMOLE_PROFILING") == "1"
+PROFILE_INTERVAL_SECONDS = 0.005
+MAX_KEPT_PROFILES = 20
+
+_profile_ids = itertools.count(1)
+_profiles: OrderedDict[int, dict] = OrderedDict()
+_profiles_lock = threading.Lock()
+
+
+class StackSampler:
+    """
+    Samples every other thread's Python stack at a fixed interval and tallies collapsed
+    stacks ("thread;outer;inner;leaf" -> samples), the input format of flamegraph tools.
+    Idle threads parked in a wait are skipped. A request may run on the event loop or on
+    any threadpool worker, so all threads are sampled; the root frame names the thread
+    so concurrent requests can be told apart.
+    """
+
+    # Leaf functions of threads parked waiting for work (threadpool, event loop, aiosqlite).
+    _IDLE = frozenset({"wait", "select", "poll", "epoll", "_worker", "get", "acquire", "_connection_worker_thread"})
+
+    def __init__(self, interval: float = PROFILE_INTERVAL_SECONDS):
+        self.interval = interval
+        self.stacks: _Tally[str] = _Tally()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="holymole-profiler", daemon=True)
+
+    def start(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def stop(self, wait: bool = True) -> None:
+        """Stop sampling; with wait, block until the last sample is tallied."""
+        self._stop.set()
+        if wait:
+            self._thread.join()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            threads = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own or frame.f_code.co_name in self._IDLE:
+                    continue
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                names.append(f"thread {threads.get(ident, ident)}")
+                self.stacks[";".join(reversed(names))] += 1
+
+
+def _keep_profile(method: str, path: str, seconds: float, sampler: StackSampler) -> int:
+    profile_id = next(_profile_ids)
+    with _profiles_lock:
+        _profiles[profile_id] = {
+            "id": profile_id,
+            "method": method,
+            "path": path,
+            "seconds": round(seconds, 6),
+            "interval_seconds": sampler.interval,
+            "samples": sampler.samples,
+            "stacks": dict(sampler.stacks.most_common()),
+        }
+        while len(_profiles) > MAX_KEPT_PROFILES:
+            _profiles.popitem(last=False)
+    return profile_id
+
+
+def get_profile(profile_id: int) -> dict | None:
+    return _profiles.get(profile_id)
+
+
+def list_profiles() -> list[dict]:
+    with _profiles_lock:
+        return [{k: p[k] for k in ("id", "method", "path", "seconds", "samples")} for p in _profiles.values()]
+
+
+def _wants_profile(scope) -> bool:
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    if "1" in query.get("profile", ()):
+        return True
+    return any(name == b"x-profile" and value == b"1" for name, value in scope.get("headers", ()))
+
+
+# ----- Middleware -----
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (no per-request task or body buffering). Latency is measured to
+    the response headers, so long-lived streams such as /stream count their set-up only.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = ["500"]
+        queries = [0]
+        token = _request_queries.set(queries)
+        sampler = StackSampler().start() if PROFILING_ENABLED and _wants_profile(scope) else None
+        recorded = False
+
+        def record() -> None:
+            nonlocal recorded
+            if recorded:
+                return
+            recorded = True
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            REQUEST_SECONDS.observe(time.perf_counter() - started, scope["method"], template, status[0])
+            REQUEST_DB_QUERIES.observe(queries[0], template)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = str(message["status"])
+                record()
+                if sampler is not None:
+                    # Joining the sampler thread blocks; keep that off the event loop.
+                    await asyncio.to_thread(sampler.stop)
+                    profile_id = _keep_profile(scope["method"], scope["path"], time.perf_counter() - started, sampler)
+                    message.setdefault("headers", []).append((b"x-profile-id", str(profile_id).encode()))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_queries.reset(token)
+            record()
+            if sampler is not None:
+                sampler.stop(wait=False)
@@ -0,0 +1,161 @@
+"""
+Budget-constrained auto-reorder planner for Holy Mole.
+Picks reorder quantities across every ingredient to minimise expected revenue at risk
+over a planning horizon. Risk is counted per menu item per hour (a menu item is down
+while any of its ingredients is out), so shared ingredients such as Tortilla or Lime
+are valued for every item they keep on the menu, without double counting.
+Solved with a lazy greedy over a max-heap of marginal value per dollar.
+"""
+import heapq
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+
+from risk import RiskMatrix
+from simulation import SERVICE_HOURS_PER_DAY
+
+# Reorders are planned in packs covering this many hours of average usage.
+PACK_HOURS = 8.0
+
+# Weight of an ingredient's own outage hours (times its blast-radius revenue) in a
+# pack's value. Exact menu-level gain is zero when another ingredient keeps the item
+# down; this term lets the greedy climb out of that plateau.
+STANDALONE_WEIGHT = 0.1
+
+DEFAULT_LEAD_TIME_HOURS = 24.0
+DEFAULT_HORIZON_HOURS = 72
+
+
+@dataclass
+class StockLine:
+    ingredient_id: int
+    name: str
+    quantity: float
+    daily_usage: float
+    unit_cost: float
+    unit: str
+
+
+def _out_hours(quantity: float, hourly: float, added: float, lead_time: float, hours: np.ndarray) -> np.ndarray:
+    """Boolean per planning hour: is the ingredient out, given `added` units arriving at lead_time?"""
+    if hourly <= 0:
+        return np.zeros(hours.size, dtype=bool) if quantity > 0 or added > 0 else np.ones(hours.size, dtype=bool)
+    on_hand = quantity - hourly * hours + np.where(hours >= lead_time, added, 0.0)
+    return on_hand <= 0
+
+
+def plan_reorder(
+    matrix: RiskMatrix,
+    lines: list[StockLine],
+    budget: float,
+    lead_times: dict[str, float],
+    default_lead_time: float = DEFAULT_LEAD_TIME_HOURS,
+    horizon_hours: int = DEFAULT_HORIZON_HOURS,
+) -> dict[str, Any]:
+    """Return the chosen orders plus expected revenue at risk before and after."""
+    hours = np.arange(horizon_hours, dtype=np.float64) + 0.5
+    lead_by_name = {name.casefold(): float(h) for name, h in lead_times.items()}
+    row_of = {name.casefold(): row for row, name in enumerate(matrix.ingredients)}
+    csr = matrix.matrix
+    revenue = matrix.revenue
+
+    # Menu-item x hour count of ingredients that are out.
+    out_count = np.zeros((len(matrix.menu_items), horizon_hours), dtype=np.int32)
+    states = []
+    for line in lines:
+        row = row_of.get(line.name.casefold())
+        if row is None:
+            continue
+        menus = csr.indices[csr.indptr[row]:csr.indptr[row + 1]]
+        # Same burn rate as the rush simulator: daily usage spread over service hours.
+        hourly = max(0.0, line.daily_usage) / SERVICE_HOURS_PER_DAY
+        lead = lead_by_name.get(line.name.casefold(), default_lead_time)
+        out = _out_hours(line.quantity, hourly, 0.0, lead, hours)
+        out_count[menus] += out
+        states.append(
+            {
+                "line": line,
+                "menus": menus,
+                "blast": float(revenue[menus].sum()),
+                "hourly": hourly,
+                "lead": lead,
+                "added": 0.0,
+                "out": out,
+            }
+        )
+
+    def risk_total() -> float:
+        return float(((out_count > 0).sum(axis=1) * revenue).sum())
+
+    def gain(state: dict, pack: float) -> tuple[float, np.ndarray]:
+        line = state["line"]
+        new_out = _out_hours(line.quantity, state["hourly"], state["added"] + pack, state["lead"], hours)
+        menus = state["menus"]
+        if menus.size == 0:
+            return 0.0, new_out
+        before = out_count[menus] > 0
+        after = (out_count[menus] - state["out"] + new_out) > 0
+        exact = float(((before.sum(axis=1) - after.sum(axis=1)) * revenue[menus]).sum())
+        standalone = float(state["out"].sum() - new_out.sum()) * state["blast"]
+        return exact + STANDALONE_WEIGHT * standalone, new_out
+
+    risk_before = risk_total()
+    remaining = float(budget)
+    heap: list[tuple[float, int]] = []
+    for i, state in enumerate(states):
+        if state["hourly"] > 0 and state["menus"].size:
+            value, _ = gain(state, state["hourly"] * PACK_HOURS)
+            if value > 0:
+                cost = state["hourly"] * PACK_HOURS * state["line"].unit_cost
+                heapq.heappush(heap, (-value / max(cost, 1e-9), i))
+
+    while heap and remaining > 0:
+        _, i = heapq.heappop(heap)
+        state = states[i]
+        pack = state["hourly"] * PACK_HOURS
+        cost = pack * state["line"].unit_cost
+        if cost > remaining + 1e-9:
+            continue
+        value, new_out = gain(state, pack)
+        if value <= 0:
+            continue
+        ratio = value / max(cost, 1e-9)
+        # Lazy greedy: other picks may have lowered this pack's value; re-queue if so.
+        if heap and ratio < -heap[0][0] - 1e-12:
+            heapq.heappush(heap, (-ratio, i))
+            continue
+        out_count[state["menus"]] += new_out.astype(np.int32) - state["out"]
+        state["out"] = new_out
+        state["added"] += pack
+        remaining -= cost
+        next_value, _ = gain(state, pack)
+        if next_value > 0:
+            heapq.heappush(heap, (-next_value / max(cost, 1e-9), i))
+
+    orders = []
+    for state in states:
+        if state["added"] <= 0:
+            continue
+        line = state["line"]
+        quantity = round(state["added"], 2)
+        orders.append(
+            {
+                "ingredient_id": line.ingredient_id,
+                "ingredient": line.name,
+                "quantity": quantity,
+                "unit": line.unit,
+                "unit_cost": line.unit_cost,
+                "cost": round(quantity * line.unit_cost, 2),
+                "lead_time_hours": state["lead"],
+            }
+        )
+    orders.sort(key=lambda o: -o["cost"])
+    return {
+        "budget": budget,
+        "total_cost": round(sum(o["cost"] for o in orders), 2),
+        "horizon_hours": horizon_hours,
+        "expected_revenue_at_risk_before": round(risk_before, 2),
+        "expected_revenue_at_risk_after": round(risk_total(), 2),
+        "orders": orders,
+    }
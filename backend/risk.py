@@ -0,0 +1,112 @@
+"""
+Vectorized revenue-at-risk for Holy Mole.
+Turns the compiled recipe graph into a sparse ingredient x menu-item reachability
+matrix so risk for every ingredient, or for any batch of stockout masks, is one
+matrix product instead of one DFS per ingredient.
+"""
+from typing import Any, Iterable
+
+import numpy as np
+from scipy import sparse
+
+from logic import CompiledGraph, GraphCache
+
+
+class RiskMatrix:
+    """Reachability matrix for one compiled graph revision.
+
+    Rows are every non-menu node (raw ingredients and sub-recipes), columns are menu
+    items; R[i, m] == 1 when losing row i makes menu item m unsellable.
+    """
+
+    def __init__(self, graph: CompiledGraph):
+        self.graph = graph
+        self.revision = graph.revision
+        self.total_menu_count = graph.menu_count
+
+        menu_ids = [nid for nid, kind in enumerate(graph.kinds) if kind == "menu_item"]
+        row_ids = [nid for nid, kind in enumerate(graph.kinds) if kind != "menu_item"]
+        col_of = {nid: col for col, nid in enumerate(menu_ids)}
+
+        self.menu_items = [graph.names[nid] for nid in menu_ids]
+        self.ingredients = [graph.names[nid] for nid in row_ids]
+        self.kinds = [graph.kinds[nid] for nid in row_ids]
+        self.row_index = {name.casefold(): row for row, name in enumerate(self.ingredients)}
+        self.revenue = np.array([graph.revenue[nid] for nid in menu_ids], dtype=np.float64)
+
+        indptr = np.zeros(len(row_ids) + 1, dtype=np.int64)
+        indices: list[int] = []
+        for row, nid in enumerate(row_ids):
+            indices.extend(col_of[m] for m in graph.affected(nid))
+            indptr[row + 1] = len(indices)
+        data = np.ones(len(indices), dtype=np.float64)
+        self.matrix = sparse.csr_matrix(
+            (data, np.asarray(indices, dtype=np.int64), indptr),
+            shape=(len(row_ids), len(menu_ids)),
+        )
+
+    def revenue_at_risk(self) -> np.ndarray:
+        """Revenue lost per hour if each row ran out on its own."""
+        return self.matrix @ self.revenue
+
+    def affected_counts(self) -> np.ndarray:
+        return np.diff(self.matrix.indptr)
+
+    def mask_for(self, names: Iterable[str]) -> np.ndarray:
+        """Boolean row mask for a set of stocked-out names; unknown names are ignored."""
+        mask = np.zeros(len(self.ingredients), dtype=bool)
+        for name in names:
+            row = self.row_index.get(name.strip().casefold())
+            if row is not None:
+                mask[row] = True
+        return mask
+
+    def revenue_for_masks(self, masks: np.ndarray) -> np.ndarray:
+        """
+        Revenue lost per hour for each stockout scenario.
+        `masks` is (scenarios, rows) boolean; a menu item is counted once no matter how
+        many of its ingredients are out.
+        """
+        masks = np.atleast_2d(np.asarray(masks, dtype=np.float64))
+        hits = (self.matrix.T @ masks.T).T > 0
+        return hits @ self.revenue
+
+
+_risk_matrices: GraphCache[RiskMatrix] = GraphCache(RiskMatrix)
+
+
+def get_risk_matrix(graph: CompiledGraph) -> RiskMatrix:
+    """Return the risk matrix for the given compiled graph, building it once per graph."""
+    return _risk_matrices.get(graph)
+
+
+def discard_risk_matrix(graph: CompiledGraph) -> None:
+    _risk_matrices.discard(graph)
+
+
+def risk_table(matrix: RiskMatrix) -> dict[str, Any]:
+    """Revenue at risk for every ingredient and sub-recipe, highest risk first."""
+    risk = matrix.revenue_at_risk()
+    counts = matrix.affected_counts()
+    order = np.argsort(-risk, kind="stable")
+    return {
+        "revision": matrix.revision,
+        "total_menu_count": matrix.total_menu_count,
+        "ingredients": [
+            {
+                "ingredient": matrix.ingredients[row],
+                "type": matrix.kinds[row],
+                "affected_menu_count": int(counts[row]),
+                "total_revenue_risk_per_hour": round(float(risk[row]), 2),
+            }
+            for row in order
+        ],
+    }
+
+
+def scenario_risk(scenarios: list[list[str]], matrix: RiskMatrix) -> list[float]:
+    """Revenue at risk per hour for each stockout scenario (a list of ingredient names)."""
+    if not scenarios:
+        return []
+    masks = np.stack([matrix.mask_for(names) for names in scenarios])
+    return [round(float(r), 2) for r in matrix.revenue_for_masks(masks)]
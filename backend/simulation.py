@@ -0,0 +1,227 @@
+"""
+Monte Carlo "Friday Night Rush" simulator for Holy Mole.
+Runs thousands of rush scenarios against a copy of current stock without touching the
+database. Each chunk of scenarios is simulated as NumPy arrays (scenario x ingredient),
+stepping through the rush with a running usage total; chunks are spread across a
+process pool. Chunks carry their own child seeds, so a given seed gives the same answer
+whatever the worker count.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+
+from risk import RiskMatrix
+
+# Hours of service that daily_usage is spread over (planner.py burns stock at the same rate).
+SERVICE_HOURS_PER_DAY = 12.0
+
+# Scenarios simulated per task; also the unit of seeding, so results do not depend on
+# how chunks are distributed over workers.
+SCENARIOS_PER_CHUNK = 500
+
+# Rough cap on the float64 working arrays of one batch inside a chunk; a chunk is split
+# into scenario batches so a very large graph never needs (chunk x nodes) arrays at once.
+BATCH_MEMORY_BYTES = 64 * 1024 * 1024
+
+# Size of the one shared process pool; a request's `workers` is capped to it.
+MAX_WORKERS = os.cpu_count() or 1
+
+
+@dataclass(frozen=True)
+class RushInputs:
+    """Plain arrays shipped to workers (rows follow RiskMatrix.ingredients)."""
+
+    quantity: np.ndarray  # on-hand stock per row; inf for rows not tracked in inventory
+    hourly_usage: np.ndarray  # mean usage per hour during the rush
+    menu_indptr: np.ndarray  # CSC of the reachability matrix: menu item -> rows
+    menu_rows: np.ndarray
+    revenue: np.ndarray  # revenue per hour per menu item
+    hours: float
+    step_minutes: float
+    usage_cv: float
+
+
+def build_inputs(
+    matrix: RiskMatrix,
+    stock: dict[str, tuple[float, float]],
+    hours: float = 4.0,
+    rush_multiplier: float = 2.5,
+    step_minutes: float = 5.0,
+    usage_cv: float = 0.5,
+) -> RushInputs:
+    """`stock` maps ingredient name -> (quantity, daily_usage)."""
+    by_name = {name.casefold(): value for name, value in stock.items()}
+    n = len(matrix.ingredients)
+    quantity = np.full(n, np.inf)
+    hourly = np.zeros(n)
+    for row, name in enumerate(matrix.ingredients):
+        value = by_name.get(name.casefold())
+        if value is None:
+            continue
+        qty, daily_usage = value
+        hourly[row] = max(0.0, daily_usage) / SERVICE_HOURS_PER_DAY * rush_multiplier
+        # Stock that is never used cannot run out during the rush.
+        quantity[row] = max(0.0, qty) if hourly[row] > 0 or qty <= 0 else np.inf
+    csc = matrix.matrix.tocsc()
+    return RushInputs(
+        quantity=quantity,
+        hourly_usage=hourly,
+        menu_indptr=csc.indptr.astype(np.int64),
+        menu_rows=csc.indices.astype(np.int64),
+        revenue=matrix.revenue.copy(),
+        hours=hours,
+        step_minutes=step_minutes,
+        usage_cv=usage_cv,
+    )
+
+
+def _simulate_chunk(inputs: RushInputs, n: int, seed: np.random.SeedSequence) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Simulate `n` scenarios. Returns (time to first stockout in hours, inf if none;
+    revenue lost per hour; index of the first row to run out, -1 if none).
+    """
+    rng = np.random.default_rng(seed)
+    # The widest per-scenario array is the gathered menu -> row stockout times.
+    width = max(inputs.quantity.size, inputs.menu_rows.size + 1)
+    batch = max(1, BATCH_MEMORY_BYTES // (8 * width))
+    parts = [_simulate_batch(inputs, min(batch, n - start), rng) for start in range(0, n, batch)]
+    return tuple(np.concatenate(arrays) for arrays in zip(*parts))
+
+
+def _simulate_batch(inputs: RushInputs, n: int, rng: np.random.Generator) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    dt = inputs.step_minutes / 60.0
+    steps = max(1, int(round(inputs.hours / dt)))
+    tracked = np.flatnonzero(np.isfinite(inputs.quantity))
+    qty = inputs.quantity[tracked]
+    scale = inputs.hourly_usage[tracked] * dt
+
+    # Gamma-distributed usage per step with the requested coefficient of variation,
+    # accumulated step by step so only the running total is held, never the
+    # (scenario x step x ingredient) cube.
+    shape = 1.0 / (inputs.usage_cv ** 2)
+    scale = scale / shape
+    consumed = np.zeros((n, tracked.size))
+    first_step = np.full((n, tracked.size), steps)
+    for step in range(steps):
+        consumed += rng.gamma(shape, 1.0, size=(n, tracked.size)) * scale
+        first_step[(consumed >= qty) & (first_step == steps)] = step
+    hit = first_step < steps
+
+    stockout_time = np.full((n, inputs.quantity.size), np.inf)
+    stockout_time[:, tracked] = np.where(hit, (first_step + 1) * dt, np.inf)
+    stockout_time[:, tracked[qty <= 0]] = 0.0
+
+    first_row = stockout_time.argmin(axis=1)
+    first_time = stockout_time[np.arange(n), first_row]
+    first_row = np.where(np.isfinite(first_time), first_row, -1)
+
+    # A menu item goes down when the first of its ingredients does.
+    # A trailing inf column keeps every reduceat start index in range.
+    gathered = np.concatenate([stockout_time[:, inputs.menu_rows], np.full((n, 1), np.inf)], axis=1)
+    menu_out = np.minimum.reduceat(gathered, inputs.menu_indptr[:-1], axis=1)
+    menu_out[:, np.diff(inputs.menu_indptr) == 0] = np.inf
+    downtime = np.clip(inputs.hours - menu_out, 0.0, inputs.hours)
+    lost_per_hour = downtime @ inputs.revenue / inputs.hours
+    return first_time, lost_per_hour, first_row
+
+
+def _run_chunks(tasks: list[tuple[RushInputs, int, np.random.SeedSequence]]) -> list:
+    return [_simulate_chunk(*task) for task in tasks]
+
+
+_pool_lock = threading.Lock()
+_pool: ProcessPoolExecutor | None = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """
+    The shared pool, MAX_WORKERS processes, created on first use. Workers come from a
+    forkserver rather than forking the multithreaded server process; preloading this
+    module also hands them the server's sys.path.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            context = multiprocessing.get_context("forkserver")
+            context.set_forkserver_preload([__name__])
+            _pool = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=context)
+        return _pool
+
+
+def _plan(
+    inputs: RushInputs, scenarios: int, seed: int | None, workers: int | None
+) -> list[list[tuple[RushInputs, int, np.random.SeedSequence]]]:
+    """Chunk tasks dealt round-robin into one group per worker (at most MAX_WORKERS)."""
+    sizes = [SCENARIOS_PER_CHUNK] * (scenarios // SCENARIOS_PER_CHUNK)
+    if scenarios % SCENARIOS_PER_CHUNK:
+        sizes.append(scenarios % SCENARIOS_PER_CHUNK)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(inputs, size, s) for size, s in zip(sizes, seeds)]
+    workers = max(1, min(workers or MAX_WORKERS, MAX_WORKERS, len(tasks)))
+    return [tasks[i::workers] for i in range(workers)]
+
+
+def _assemble(groups: list[list]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Undo the round-robin deal so chunks are concatenated in seed order."""
+    workers = len(groups)
+    ordered = [None] * sum(len(g) for g in groups)
+    for i, group in enumerate(groups):
+        ordered[i::workers] = group
+    return tuple(np.concatenate(parts) for parts in zip(*ordered))
+
+
+def run_scenarios(
+    inputs: RushInputs, scenarios: int, seed: int | None = None, workers: int | None = None
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Run `scenarios` rushes, on up to `workers` pool processes when there is more than one chunk."""
+    groups = _plan(inputs, scenarios, seed, workers)
+    if len(groups) == 1:
+        return _assemble([_run_chunks(groups[0])])
+    return _assemble(list(_get_pool().map(_run_chunks, groups)))
+
+
+async def run_scenarios_async(
+    inputs: RushInputs, scenarios: int, seed: int | None = None, workers: int | None = None
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """run_scenarios for request handlers: awaits the pool instead of holding a thread."""
+    groups = _plan(inputs, scenarios, seed, workers)
+    pool = _get_pool()
+    results = await asyncio.gather(*(asyncio.wrap_future(pool.submit(_run_chunks, g)) for g in groups))
+    return _assemble(list(results))
+
+
+def _percentiles(values: np.ndarray) -> dict[str, float | None]:
+    finite = values[np.isfinite(values)]
+    if finite.size == 0:
+        return {"p5": None, "p50": None, "p95": None}
+    p5, p50, p95 = np.percentile(finite, [5, 50, 95])
+    return {"p5": round(float(p5), 3), "p50": round(float(p50), 3), "p95": round(float(p95), 3)}
+
+
+def summarize(
+    matrix: RiskMatrix, inputs: RushInputs, results: tuple[np.ndarray, np.ndarray, np.ndarray], seed: int | None
+) -> dict[str, Any]:
+    first_time, lost_per_hour, first_row = results
+    n = first_time.size
+    rows, counts = np.unique(first_row[first_row >= 0], return_counts=True)
+    order = np.argsort(-counts, kind="stable")[:10]
+    return {
+        "scenarios": n,
+        "seed": seed,
+        "hours": inputs.hours,
+        "stockout_probability": round(float(np.isfinite(first_time).mean()), 4) if n else 0.0,
+        "time_to_first_stockout_hours": _percentiles(first_time),
+        "revenue_lost_per_hour": {
+            "mean": round(float(lost_per_hour.mean()), 2) if n else 0.0,
+            **{k: (round(v, 2) if v is not None else None) for k, v in _percentiles(lost_per_hour).items()},
+        },
+        "first_stockout_ingredients": [
+            {"ingredient": matrix.ingredients[rows[i]], "share": round(float(counts[i] / n), 4)} for i in order
+        ],
+    }
@@ -0,0 +1,142 @@
+"""
+Bulk stock movements for Holy Mole.
+Explodes POS sales of menu items into ingredient depletion through the recipe graph,
+aggregates per ingredient in memory and applies everything as one executemany UPDATE.
+"""
+import math
+from typing import Any, Iterable
+
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.orm import Session
+
+from database import Ingredient
+from logic import CompiledGraph, GraphCache
+
+_ingredients = Ingredient.__table__
+
+
+class MovementError(ValueError):
+    """A stock-movement event could not be parsed or validated."""
+
+
+def parse_movement(event: Any, line_no: int) -> tuple[str, str, float]:
+    """
+    Validate one event and return (kind, name, quantity).
+    Sales look like {"menu_item": "Steak Tacos", "quantity": 2}; direct usage or waste
+    like {"ingredient": "Lime", "quantity": 1.5}. Quantity defaults to 1.
+    """
+    if not isinstance(event, dict):
+        raise MovementError(f"line {line_no}: expected a JSON object")
+    if "menu_item" in event:
+        kind, name = "menu_item", event["menu_item"]
+    elif "ingredient" in event:
+        kind, name = "ingredient", event["ingredient"]
+    else:
+        raise MovementError(f"line {line_no}: needs 'menu_item' or 'ingredient'")
+    quantity = event.get("quantity", 1)
+    if not isinstance(name, str) or not name.strip():
+        raise MovementError(f"line {line_no}: name must be a non-empty string")
+    if isinstance(quantity, bool) or not isinstance(quantity, (int, float)) or not math.isfinite(quantity):
+        raise MovementError(f"line {line_no}: quantity must be a finite number")
+    return kind, name.strip(), float(quantity)
+
+
+class BillOfMaterials:
+    """
+    Per-portion depletion of stocked ingredients for every graph node. A stocked node is
+    depleted directly; an unstocked sub-recipe is made on the fly from its children.
+    Cached per (graph, set of stocked nodes).
+    """
+
+    def __init__(self, graph: CompiledGraph, stocked: frozenset[int]):
+        self.graph = graph
+        self.stocked = stocked
+        children: list[list[tuple[int, float]]] = [[] for _ in graph.names]
+        for child in range(len(graph.names)):
+            for i in range(graph.rev_offsets[child], graph.rev_offsets[child + 1]):
+                children[graph.rev_targets[i]].append((child, graph.rev_quantities[i]))
+        self._children = children
+        self._memo: dict[int, dict[int, float]] = {}
+
+    def per_portion(self, nid: int) -> dict[int, float]:
+        memo = self._memo.get(nid)
+        if memo is not None:
+            return memo
+        if nid in self.stocked or not self._children[nid]:
+            bom = {nid: 1.0}
+        else:
+            bom = {}
+            for child, qty in self._children[nid]:
+                for leaf, leaf_qty in self.per_portion(child).items():
+                    bom[leaf] = bom.get(leaf, 0.0) + qty * leaf_qty
+        self._memo[nid] = bom
+        return bom
+
+
+_boms: GraphCache[BillOfMaterials] = GraphCache(BillOfMaterials)
+
+
+def get_bill_of_materials(graph: CompiledGraph, stocked: frozenset[int]) -> BillOfMaterials:
+    """Bill of materials for the graph, rebuilt when the set of stocked rows changes."""
+    return _boms.get(graph, stocked)
+
+
+def discard_bill_of_materials(graph: CompiledGraph) -> None:
+    _boms.discard(graph)
+
+
+def aggregate_depletion(
+    db: Session, graph: CompiledGraph, movements: Iterable[tuple[str, str, float]]
+) -> tuple[dict[int, float], list[str]]:
+    """
+    Sum depletion per ingredient row for a batch of parsed movements.
+    Returns (ingredient id -> quantity used, names that matched nothing).
+    """
+    by_name: dict[str, int] = {}
+    row_of: dict[int, int] = {}
+    for ingredient_id, name in db.execute(select(Ingredient.id, Ingredient.name)):
+        by_name.setdefault(name.casefold(), ingredient_id)
+        nid = graph.resolve(name)
+        if nid is not None:
+            row_of.setdefault(nid, ingredient_id)
+    bom = get_bill_of_materials(graph, frozenset(row_of))
+
+    per_node: dict[int, float] = {}
+    totals: dict[int, float] = {}
+    unknown: dict[str, None] = {}
+    for kind, name, quantity in movements:
+        if kind == "ingredient":
+            ingredient_id = by_name.get(name.casefold())
+            if ingredient_id is None:
+                unknown[name] = None
+            else:
+                totals[ingredient_id] = totals.get(ingredient_id, 0.0) + quantity
+            continue
+        nid = graph.resolve(name)
+        if nid is None or graph.kinds[nid] != "menu_item":
+            unknown[name] = None
+            continue
+        per_node[nid] = per_node.get(nid, 0.0) + quantity
+
+    # Explode each distinct menu item once, however many sale lines mention it.
+    for nid, portions in per_node.items():
+        for leaf, qty in bom.per_portion(nid).items():
+            ingredient_id = row_of.get(leaf)
+            if ingredient_id is None:
+                unknown[graph.names[leaf]] = None
+            else:
+                totals[ingredient_id] = totals.get(ingredient_id, 0.0) + portions * qty
+    return totals, list(unknown)
+
+
+_DEPLETE = (
+    update(_ingredients)
+    .where(_ingredients.c.id == bindparam("ingredient_id"))
+    .values(quantity=func.max(0.0, func.round(_ingredients.c.quantity - bindparam("used"), 4)))
+)
+
+
+def apply_depletion(db: Session, totals: dict[int, float]) -> None:
+    """One executemany UPDATE for the whole batch; the caller owns the transaction."""
+    if totals:
+        db.execute(_DEPLETE, [{"ingredient_id": i, "used": used} for i, used in totals.items()])
@@ -0,0 +1,46 @@
+import itertools
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+# The backend is a flat set of modules run from backend/; make them importable here.
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.join(BACKEND, "benchmarks"))
+
+# database.py resolves its relative SQLite paths when the engines are created, which is
+# at import during collection, so the whole session runs from a throwaway directory.
+_cwd = os.getcwd()
+_workdir = tempfile.mkdtemp(prefix="holymole-tests-")
+os.chdir(_workdir)
+
+
+def pytest_unconfigure(config):
+    os.chdir(_cwd)
+    shutil.rmtree(_workdir, ignore_errors=True)
+
+
+_locations = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def client():
+    """The API on the session's throwaway databases."""
+    from fastapi.testclient import TestClient
+
+    import main
+
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def location(client):
+    """A freshly created and seeded location, so tests never share stock or ledger state."""
+    name = f"test-{next(_locations)}"
+    assert client.post(f"/locations/{name}").status_code == 200
+    assert client.post("/seed", params={"location": name}).status_code == 200
+    return name
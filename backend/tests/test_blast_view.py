@@ -0,0 +1,105 @@
+"""Pruned, grouped and columnar blast-radius payloads."""
+import pytest
+
+from blast_view import OTHER_GROUP, columnar_blast_radius, prune_blast_radius
+from logic import MENU_CATEGORIES, calculate_blast_radius, compile_builtin_graph
+from synthetic import generate_menu
+
+
+@pytest.fixture(scope="module")
+def graph():
+    return compile_builtin_graph()
+
+
+def _edge_ids(payload):
+    ids = {n["id"] for n in payload["nodes"]}
+    return {(e["from"], e["to"]) for e in payload["edges"]}, ids
+
+
+def test_max_depth_keeps_nodes_within_reach(graph):
+    full = calculate_blast_radius("Eggs", graph)
+    pruned = prune_blast_radius(full, max_depth=1)
+    edges, ids = _edge_ids(pruned)
+    assert ids == {"Eggs"} | {target for source, target in _edge_ids(full)[0] if source == "Eggs"}
+    assert all(source in ids and target in ids for source, target in edges)
+    assert pruned["pruned"]["beyond_depth"] == len(full["nodes"]) - len(ids)
+    # Totals still describe the whole blast radius.
+    assert pruned["total_revenue_risk_per_hour"] == full["total_revenue_risk_per_hour"]
+    assert pruned["affected_menu_items"] == full["affected_menu_items"]
+
+
+def test_top_k_collapses_the_rest_by_category(graph):
+    full = calculate_blast_radius("Lime", graph)
+    pruned = prune_blast_radius(full, top_k=2, group_by="category", categories=MENU_CATEGORIES)
+    menu_nodes = [n for n in pruned["nodes"] if n["type"] == "menu_item"]
+    groups = [n for n in pruned["nodes"] if n["type"] == "menu_group"]
+    ranked = sorted(full["affected_with_revenue"], key=lambda a: (-a["revenue_per_hour"], a["menu_item"]))
+    assert {n["id"] for n in menu_nodes} == {a["menu_item"] for a in ranked[:2]}
+    assert sum(g["count"] for g in groups) == len(full["affected_menu_items"]) - 2
+    assert sum(g["revenue_per_hour"] for g in groups) == pytest.approx(
+        sum(a["revenue_per_hour"] for a in ranked[2:]), abs=0.01 * len(groups)
+    )
+    edges, ids = _edge_ids(pruned)
+    assert all(source in ids and target in ids for source, target in edges)
+    assert {target for _, target in edges} >= {g["id"] for g in groups}
+    assert pruned["pruned"]["collapsed"] == len(full["affected_menu_items"]) - 2
+
+
+def test_group_by_without_top_k_collapses_every_menu_item(graph):
+    full = calculate_blast_radius("Lime", graph)
+    pruned = prune_blast_radius(full, group_by="category", categories=MENU_CATEGORIES)
+    assert not [n for n in pruned["nodes"] if n["type"] == "menu_item"]
+    labels = {n["label"] for n in pruned["nodes"] if n["type"] == "menu_group"}
+    assert labels == {MENU_CATEGORIES[m] for m in full["affected_menu_items"]}
+    # With no menu item drawn, only the ingredient itself feeds the groups.
+    assert [n["id"] for n in pruned["nodes"] if n["type"] != "menu_group"] == ["Lime"]
+
+
+def test_top_k_without_group_by_uses_one_other_node(graph):
+    full = calculate_blast_radius("Lime", graph)
+    pruned = prune_blast_radius(full, top_k=1)
+    assert [n["label"] for n in pruned["nodes"] if n["type"] == "menu_group"] == [OTHER_GROUP]
+    assert len(pruned["affected_with_revenue"]) == 1
+
+
+def test_collapsing_drops_dead_end_sub_recipes():
+    menu = generate_menu(1_000, seed=3)
+    graph = menu.compile()
+    hub = max(range(len(graph.names)), key=lambda n: len(graph.affected(n)) if graph.kinds[n] == "ingredient" else -1)
+    full = calculate_blast_radius(graph.names[hub], graph)
+    pruned = prune_blast_radius(full, top_k=3, group_by="category", categories=dict.fromkeys(menu.menu_graph, "Mains"))
+    edges, ids = _edge_ids(pruned)
+    fed = {source for source, _ in edges}
+    for node in pruned["nodes"]:
+        if node["type"] == "sub_recipe":
+            assert node["id"] in fed
+    assert len(pruned["nodes"]) < len(full["nodes"])
+
+
+def test_unknown_ingredient_prunes_to_empty(graph):
+    pruned = prune_blast_radius(calculate_blast_radius("Nope", graph), max_depth=2, top_k=1)
+    assert pruned["nodes"] == [] and pruned["edges"] == []
+    assert pruned["pruned"]["nodes_shown"] == 0
+
+
+def test_columnar_encoding_round_trips(graph):
+    full = prune_blast_radius(calculate_blast_radius("Lime", graph), top_k=2, group_by="category", categories=MENU_CATEGORIES)
+    compact = columnar_blast_radius(full)
+    assert compact["node_ids"] == [n["id"] for n in full["nodes"]]
+    assert [compact["types"][t] for t in compact["node_types"]] == [n["type"] for n in full["nodes"]]
+    pairs = list(zip(compact["edges"][::2], compact["edges"][1::2]))
+    assert [(compact["node_ids"][a], compact["node_ids"][b]) for a, b in pairs] == [(e["from"], e["to"]) for e in full["edges"]]
+    assert [compact["node_ids"][g["node"]] for g in compact["groups"]] == [
+        n["id"] for n in full["nodes"] if n["type"] == "menu_group"
+    ]
+    assert compact["pruned"] == full["pruned"]
+
+
+def test_endpoint_serves_pruned_compact_payloads(client, location):
+    response = client.get(
+        "/blast-radius/Lime", params={"location": location, "top_k": 1, "group_by": "category", "format": "compact"}
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert body["format"] == "compact" and body["pruned"]["top_k"] == 1
+    assert client.get("/blast-radius/Lime", params={"location": location, "group_by": "nope"}).status_code == 400
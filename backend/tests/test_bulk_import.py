@@ -0,0 +1,88 @@
+"""Bulk import: partial upserts, atomic replace, partial-apply reporting and export round trips."""
+import bulk
+from database import RecipeEdge, get_shard
+
+
+def _import(client, location, table, csv, **params):
+    return client.post(f"/import/{table}", params={"location": location, **params}, content=csv)
+
+
+def _inventory(client, location):
+    return {i["name"]: i for i in client.get("/inventory", params={"location": location}).json()}
+
+
+def test_upsert_only_touches_supplied_columns(client, location):
+    before = _inventory(client, location)["Lime"]
+    response = _import(client, location, "ingredients", "name,category,unit,quantity\nLime,Produce,each,5\nZest,Produce,each,3\n")
+    assert response.status_code == 200
+    assert response.json()["inserted"] == 1 and response.json()["updated"] == 1
+    after = _inventory(client, location)
+    assert after["Lime"]["quantity"] == 5
+    assert after["Lime"]["par_level"] == before["par_level"]
+    assert after["Lime"]["daily_usage"] == before["daily_usage"]
+    assert after["Zest"]["par_level"] == 0.0
+
+
+def test_bad_row_aborts_with_400_and_writes_nothing(client, location):
+    before = _inventory(client, location)
+    response = _import(client, location, "ingredients", "name,category,unit,quantity\nLime,Produce,each,5\nBad,,each,1\n")
+    assert response.status_code == 400
+    assert response.json()["detail"]["errors"] == ["line 3: 'category' is required"]
+    assert _inventory(client, location) == before
+
+
+def test_skip_drops_bad_rows(client, location):
+    response = _import(client, location, "ingredients", "name,category,unit,quantity\nBad,,each,1\nZest,Produce,each,3\n", on_error="skip")
+    assert response.status_code == 200
+    assert response.json()["skipped"] == 1 and response.json()["inserted"] == 1
+
+
+def test_abort_after_committed_chunks_reports_partial(client, location):
+    rows = "".join(f"Item{i},Pantry,each,{i}\n" for i in range(bulk.IMPORT_CHUNK_ROWS))
+    response = _import(client, location, "ingredients", f"name,category,unit,quantity\n{rows}Bad,,each,1\n")
+    assert response.status_code == 207
+    body = response.json()
+    assert body["status"] == "partial" and body["partial"] and body["aborted"]
+    assert body["rows_written"] == bulk.IMPORT_CHUNK_ROWS
+    assert "Item0" in _inventory(client, location)
+
+
+def test_aborted_replace_keeps_the_old_table(client, location):
+    before = _inventory(client, location)
+    response = _import(client, location, "ingredients", "name,category,unit,quantity\nOnly,Pantry,each,1\nBad,,each,1\n", mode="replace")
+    assert response.status_code == 400
+    assert response.json()["detail"]["rows_written"] == 0
+    assert _inventory(client, location) == before
+
+
+def test_replace_swaps_the_table(client, location):
+    response = _import(client, location, "ingredients", "name,category,unit,quantity\nOnly,Pantry,each,1\n", mode="replace")
+    assert response.status_code == 200
+    assert list(_inventory(client, location)) == ["Only"]
+
+
+def test_replacing_menu_items_drops_removed_items_recipes(client, location):
+    csv = "name,revenue_per_hour,category\nMargarita,100,Drinks\n"
+    assert _import(client, location, "menu_items", csv, mode="replace").status_code == 200
+    db = get_shard(location).SessionLocal()
+    try:
+        parents = {parent for (parent,) in db.query(RecipeEdge.parent)}
+    finally:
+        db.close()
+    assert "Margarita" in parents
+    assert "Michelada" not in parents
+    lime = client.get("/blast-radius/Lime", params={"location": location}).json()
+    assert lime["affected_menu_items"] == ["Margarita"]
+
+
+def test_recipe_edge_cycles_are_rejected(client, location):
+    response = _import(client, location, "recipe_edges", "parent,child\nLime,Margarita\n")
+    assert response.status_code == 400
+
+
+def test_export_round_trips(client, location):
+    exported = client.get("/export/ingredients", params={"location": location})
+    assert exported.status_code == 200
+    before = _inventory(client, location)
+    assert _import(client, location, "ingredients", exported.text, mode="replace").status_code == 200
+    assert _inventory(client, location) == before
@@ -0,0 +1,73 @@
+"""Stock ledger: time-travel queries, snapshot compaction and the pre-ledger baseline."""
+import time
+
+from sqlalchemy import text
+
+import ledger
+from database import Ingredient, StockSnapshot, get_shard, utcnow
+
+
+def _as_of(client, location, at, ingredient="Lime"):
+    response = client.get("/inventory/as-of", params={"location": location, "at": at.isoformat(), "ingredient": ingredient})
+    assert response.status_code == 200
+    (row,) = response.json()["ingredients"]
+    return row["quantity"]
+
+
+def _pause():
+    # Movements are stamped with utcnow(); keep the probes strictly between them.
+    time.sleep(0.01)
+
+
+def test_as_of_replays_movements_up_to_the_time(client, location):
+    seeded = _as_of(client, location, utcnow())
+    _pause()
+    before_sale = utcnow()
+    _pause()
+    client.post("/stock-movements", params={"location": location}, content='{"ingredient": "Lime", "quantity": 5}')
+    _pause()
+    after_sale = utcnow()
+    _pause()
+    restocked = client.post("/restock/Lime", params={"location": location}).json()["new_quantity"]
+    assert _as_of(client, location, before_sale) == seeded
+    assert _as_of(client, location, after_sale) == seeded - 5
+    assert _as_of(client, location, utcnow()) == restocked
+
+
+def test_unknown_ingredient_is_404(client, location):
+    response = client.get("/inventory/as-of", params={"location": location, "at": utcnow().isoformat(), "ingredient": "Nope"})
+    assert response.status_code == 404
+
+
+def test_replay_is_bounded_by_snapshots(client, location, monkeypatch):
+    monkeypatch.setattr(ledger, "SNAPSHOT_EVERY_MOVEMENTS", 3)
+    db = get_shard(location).SessionLocal()
+    try:
+        snapshots = db.query(StockSnapshot.movement_id).distinct().count()
+        checkpoints = []
+        for _ in range(7):
+            client.post("/stock-movements", params={"location": location}, content='{"ingredient": "Lime", "quantity": 1}')
+            _pause()
+            checkpoints.append((utcnow(), db.query(Ingredient.quantity).filter(Ingredient.name == "Lime").scalar()))
+            db.rollback()
+            _pause()
+        assert db.query(StockSnapshot.movement_id).distinct().count() > snapshots
+        for at, quantity in checkpoints:
+            assert _as_of(client, location, at) == quantity
+    finally:
+        db.close()
+
+
+def test_stock_from_before_the_ledger_gets_a_baseline_snapshot(client, location):
+    db = get_shard(location).SessionLocal()
+    try:
+        # A database written before the ledger existed: stock but no history at all.
+        db.execute(text("DELETE FROM stock_snapshots"))
+        db.execute(text("DELETE FROM stock_movements"))
+        db.commit()
+        ledger.ensure_baseline_snapshot(db)
+        seeded = db.query(Ingredient.quantity).filter(Ingredient.name == "Lime").scalar()
+    finally:
+        db.close()
+    client.post("/stock-movements", params={"location": location}, content='{"ingredient": "Lime", "quantity": 5}')
+    assert _as_of(client, location, utcnow()) == seeded - 5
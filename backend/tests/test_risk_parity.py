@@ -0,0 +1,68 @@
+"""
+Parity of the sparse risk matrix with the original per-ingredient DFS blast radius:
+revenue_at_risk() for every ingredient and sub-recipe, and scenario_risk() for random
+multi-ingredient stockouts, on the built-in menu and a synthetic one.
+"""
+import random
+
+import pytest
+
+from logic import MENU_GRAPH, REVENUE_IMPACT, SUB_RECIPE_GRAPH, CompiledGraph
+from risk import RiskMatrix, scenario_risk
+from synthetic import generate_menu
+
+SCENARIOS = 200
+
+
+def _reference_affected(menu_graph, sub_recipe_graph, start: str) -> set[str]:
+    """Menu items reachable from `start`: the DFS the original calculate_blast_radius ran."""
+    rev: dict[str, list[str]] = {}
+    for graph in (menu_graph, sub_recipe_graph):
+        for parent, deps in graph.items():
+            for node in deps:
+                rev.setdefault(node, []).append(parent)
+    visited: set[str] = set()
+    stack = [start]
+    while stack:
+        node = stack.pop()
+        if node in visited:
+            continue
+        visited.add(node)
+        stack.extend(d for d in rev.get(node, []) if d not in visited)
+    return {n for n in visited if n in menu_graph}
+
+
+def _menus():
+    synthetic = generate_menu(1_000, seed=7)
+    return [
+        pytest.param(MENU_GRAPH, SUB_RECIPE_GRAPH, REVENUE_IMPACT, id="builtin"),
+        pytest.param(synthetic.menu_graph, synthetic.sub_recipe_graph, synthetic.revenue_impact, id="synthetic-1k"),
+    ]
+
+
+@pytest.mark.parametrize("menu_graph, sub_recipe_graph, revenue", _menus())
+def test_revenue_at_risk_matches_dfs(menu_graph, sub_recipe_graph, revenue):
+    matrix = RiskMatrix(CompiledGraph(menu_graph, sub_recipe_graph, revenue))
+    risk = matrix.revenue_at_risk()
+    assert len(matrix.ingredients) > 0
+    for row, name in enumerate(matrix.ingredients):
+        affected = _reference_affected(menu_graph, sub_recipe_graph, name)
+        expected = sum(revenue.get(m, 0.0) for m in affected)
+        assert risk[row] == pytest.approx(expected), name
+        assert matrix.affected_counts()[row] == len(affected), name
+
+
+@pytest.mark.parametrize("menu_graph, sub_recipe_graph, revenue", _menus())
+def test_scenario_risk_matches_dfs(menu_graph, sub_recipe_graph, revenue):
+    matrix = RiskMatrix(CompiledGraph(menu_graph, sub_recipe_graph, revenue))
+    rng = random.Random(0)
+    scenarios = [rng.sample(matrix.ingredients, rng.randint(1, min(8, len(matrix.ingredients)))) for _ in range(SCENARIOS)]
+    scenarios.append([])
+    scenarios.append(["not an ingredient", matrix.ingredients[0].upper()])
+    for names, got in zip(scenarios, scenario_risk(scenarios, matrix)):
+        affected: set[str] = set()
+        for name in names:
+            key = next((k for k in matrix.ingredients if k.casefold() == name.casefold()), None)
+            if key is not None:
+                affected |= _reference_affected(menu_graph, sub_recipe_graph, key)
+        assert got == pytest.approx(round(sum(revenue.get(m, 0.0) for m in affected), 2), abs=0.011), names
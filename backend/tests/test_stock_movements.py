@@ -0,0 +1,67 @@
+"""POS stock movements: depletion through recipes, idempotent retries and key expiry."""
+import json
+from datetime import timedelta
+
+import pytest
+
+from database import IdempotencyKey, get_shard, utcnow
+from main import IDEMPOTENCY_KEY_TTL
+
+
+def _ndjson(*events) -> str:
+    return "\n".join(json.dumps(e) for e in events)
+
+
+def _quantity(client, location, name):
+    return next(i["quantity"] for i in client.get("/inventory", params={"location": location}).json() if i["name"] == name)
+
+
+def test_menu_sales_deplete_ingredients(client, location):
+    lime = _quantity(client, location, "Lime")
+    body = _ndjson({"menu_item": "Margarita", "quantity": 2}, {"ingredient": "Lime", "quantity": 1}, {"menu_item": "Nope"})
+    result = client.post("/stock-movements", params={"location": location}, content=body).json()
+    assert result["events"] == 3
+    assert result["unknown"] == ["Nope"]
+    used = next(u for u in result["updated"] if u["name"] == "Lime")["quantity_used"]
+    assert used > 1
+    assert _quantity(client, location, "Lime") == pytest.approx(lime - used)
+
+
+def test_json_array_body_and_bad_json(client, location):
+    ok = client.post("/stock-movements", params={"location": location}, content='[{"ingredient": "Lime", "quantity": 1}]')
+    assert ok.status_code == 200 and ok.json()["ingredients_updated"] == 1
+    bad = client.post("/stock-movements", params={"location": location}, content='{"ingredient": "Lime"}\n{oops')
+    assert bad.status_code == 400
+    assert bad.json()["detail"] == "line 2: invalid JSON"
+
+
+def test_retry_with_same_key_is_replayed_not_reapplied(client, location):
+    body = _ndjson({"ingredient": "Lime", "quantity": 3})
+    headers = {"Idempotency-Key": "batch-1"}
+    first = client.post("/stock-movements", params={"location": location}, content=body, headers=headers).json()
+    after_first = _quantity(client, location, "Lime")
+    second = client.post("/stock-movements", params={"location": location}, content=body, headers=headers).json()
+    assert "replayed" not in first
+    assert second["replayed"] is True
+    assert second["updated"] == first["updated"]
+    assert _quantity(client, location, "Lime") == after_first
+
+
+def test_expired_keys_are_pruned_and_reusable(client, location):
+    body = _ndjson({"ingredient": "Lime", "quantity": 1})
+    client.post("/stock-movements", params={"location": location}, content=body, headers={"Idempotency-Key": "old"})
+    db = get_shard(location).SessionLocal()
+    try:
+        db.query(IdempotencyKey).update({IdempotencyKey.created_at: utcnow() - IDEMPOTENCY_KEY_TTL - timedelta(minutes=1)})
+        db.commit()
+        before = _quantity(client, location, "Lime")
+        again = client.post("/stock-movements", params={"location": location}, content=body, headers={"Idempotency-Key": "old"})
+        assert "replayed" not in again.json()
+        assert _quantity(client, location, "Lime") == pytest.approx(before - 1)
+        client.post("/stock-movements", params={"location": location}, content=body, headers={"Idempotency-Key": "new"})
+        db.expire_all()
+        cutoff = utcnow() - IDEMPOTENCY_KEY_TTL
+        assert db.query(IdempotencyKey).filter(IdempotencyKey.created_at < cutoff).count() == 0
+        assert {k.key for k in db.query(IdempotencyKey)} == {"old", "new"}
+    finally:
+        db.close()
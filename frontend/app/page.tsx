@@ -2,7 +2,13 @@
 
 import { useEffect, useState } from "react";
 import { Database, Loader2, Flame } from "lucide-react";
-import { fetchInventory, seedDatabase, simulateRush, type Ingredient } from "@/lib/api";
+import {
+  fetchInventory,
+  seedDatabase,
+  simulateRush,
+  subscribeInventory,
+  type Ingredient,
+} from "@/lib/api";
 import {
   Table,
   TableBody,
@@ -57,6 +63,14 @@ function formatDaysOnHand(item: Ingredient): { text: string; isLow: boolean } {
   };
 }
 
+/** Same order as GET /inventory: critical first, then fewest days on hand. */
+function sortInventory(items: Ingredient[]): Ingredient[] {
+  const doh = (i: Ingredient) => (i.daily_usage > 0 ? i.quantity / i.daily_usage : 999);
+  return [...items].sort(
+    (a, b) => Number(!isCritical(a)) - Number(!isCritical(b)) || doh(a) - doh(b)
+  );
+}
+
 export default function Home() {
   const [inventory, setInventory] = useState<Ingredient[]>([]);
   const [loading, setLoading] = useState(true);
@@ -80,7 +94,26 @@ export default function Home() {
   };
 
   useEffect(() => {
-    load();
+    // One snapshot over the stream, then apply only the changed rows.
+    const close = subscribeInventory({
+      onSnapshot: (snapshot) => {
+        setInventory(snapshot.ingredients);
+        setLoading(false);
+      },
+      onDelta: (delta) => {
+        setInventory((prev) => {
+          const changed = new Map(delta.changed.map((i) => [i.id, i]));
+          const merged = prev.map((i) => changed.get(i.id) ?? i);
+          for (const i of delta.changed) {
+            if (!prev.some((p) => p.id === i.id)) merged.push(i);
+          }
+          return sortInventory(merged);
+        });
+      },
+      // Stream dropped (EventSource retries on its own); fall back to a plain fetch.
+      onError: () => load(),
+    });
+    return close;
   }, []);
 
   const handleSeed = async () => {
@@ -88,7 +121,6 @@ export default function Home() {
     setError(null);
     try {
       await seedDatabase();
-      await load();
     } catch (e) {
       setError(e instanceof Error ? e.message : "Failed to seed");
     } finally {
@@ -101,7 +133,6 @@ export default function Home() {
     setError(null);
     try {
       await simulateRush();
-      await load();
     } catch (e) {
       setError(e instanceof Error ? e.message : "Failed to simulate rush");
     } finally {
@@ -110,8 +141,7 @@ export default function Home() {
   };
 
   const handleRestockSuccess = async () => {
-    // Refresh inventory after successful restock
-    await load();
+    // The stream pushes the restocked row; nothing to refetch.
   };
 
   return (
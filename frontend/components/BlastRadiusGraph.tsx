@@ -13,24 +13,35 @@ import ReactFlow, {
 } from "reactflow";
 import "reactflow/dist/style.css";
 import { Loader2, X, Package } from "lucide-react";
-import { fetchBlastRadius, restockIngredient, type BlastRadiusResponse } from "@/lib/api";
+import {
+  fetchBlastRadius,
+  restockIngredient,
+  type BlastRadiusNode as BlastNode,
+  type BlastRadiusOptions,
+  type BlastRadiusResponse,
+} from "@/lib/api";
 import { cn } from "@/lib/utils";
 
 const NODE_WIDTH = 140;
 const NODE_HEIGHT = 44;
 const LAYER_GAP = 100;
+// Hub ingredients reach far more menu items than the graph can draw: the top ones by
+// revenue get their own node and the rest are collapsed per menu category.
+const GRAPH_OPTIONS: BlastRadiusOptions = { topK: 12, groupBy: "category" };
 
 function BlastRadiusNode({
   data,
 }: {
-  data: { label: string; type: "ingredient" | "sub_recipe" | "menu_item" };
+  data: { label: string; type: BlastNode["type"]; count?: number };
 }) {
   const style =
     data.type === "ingredient"
       ? "bg-red-500 text-white border-red-600 shadow-md"
       : data.type === "sub_recipe"
         ? "bg-amber-500 text-white border-amber-600 shadow-md"
-        : "bg-slate-400 text-slate-900 border-slate-500";
+        : data.type === "menu_group"
+          ? "border-dashed bg-slate-200 text-slate-900 border-slate-500"
+          : "bg-slate-400 text-slate-900 border-slate-500";
 
   return (
     <div
@@ -40,6 +51,7 @@ function BlastRadiusNode({
       )}
     >
       {data.label}
+      {data.count !== undefined && <span className="ml-1 text-xs opacity-75">({data.count})</span>}
     </div>
   );
 }
@@ -52,7 +64,7 @@ function layoutNodesAndEdges(data: BlastRadiusResponse): { nodes: Node[]; edges:
   const byType = {
     ingredient: data.nodes.filter((n) => n.type === "ingredient"),
     sub_recipe: data.nodes.filter((n) => n.type === "sub_recipe"),
-    menu_item: data.nodes.filter((n) => n.type === "menu_item"),
+    menu_item: data.nodes.filter((n) => n.type === "menu_item" || n.type === "menu_group"),
   };
 
   const layers = [byType.menu_item, byType.sub_recipe, byType.ingredient].filter(
@@ -67,7 +79,7 @@ function layoutNodesAndEdges(data: BlastRadiusResponse): { nodes: Node[]; edges:
       nodes.push({
         id: n.id,
         type: "blast",
-        data: { label: n.label, type: n.type },
+        data: { label: n.label, type: n.type, count: n.count },
         position: { x: startX + i * (NODE_WIDTH + 40), y },
       });
     });
@@ -107,7 +119,7 @@ function BlastRadiusGraphInner({ ingredientName, onRestockSuccess }: { ingredien
     setError(null);
     setLoading(true);
     setRestockInfo(null);
-    fetchBlastRadius(ingredientName)
+    fetchBlastRadius(ingredientName, GRAPH_OPTIONS)
       .then(setData)
       .catch((e) => setError(e instanceof Error ? e.message : "Failed to load"))
       .finally(() => setLoading(false));
@@ -215,6 +227,11 @@ function BlastRadiusGraphInner({ ingredientName, onRestockSuccess }: { ingredien
               </span>
             </li>
           ))}
+          {data.affected_menu_items.length > list.length && (
+            <li className="text-sm text-muted-foreground">
+              +{data.affected_menu_items.length - list.length} more menu items
+            </li>
+          )}
         </ul>
         <div className="mt-3 flex items-center justify-between border-t border-border pt-3 text-sm font-semibold">
           <span>Total revenue at risk</span>
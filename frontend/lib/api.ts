@@ -11,10 +11,61 @@ export interface Ingredient {
   daily_usage: number;
 }
 
+// Last body and ETag per URL, so repeat reads are conditional and a 304 reuses them.
+const etagCache = new Map<string, { etag: string; body: unknown }>();
+
+async function fetchConditional<T>(url: string, errorMessage: string): Promise<T> {
+  const cached = etagCache.get(url);
+  const res = await fetch(url, {
+    cache: "no-store",
+    headers: cached ? { "If-None-Match": cached.etag } : undefined,
+  });
+  if (res.status === 304 && cached) return cached.body as T;
+  if (!res.ok) throw new Error(errorMessage);
+  const body = await res.json();
+  const etag = res.headers.get("ETag");
+  if (etag) etagCache.set(url, { etag, body });
+  return body as T;
+}
+
 export async function fetchInventory(): Promise<Ingredient[]> {
-  const res = await fetch(`${API_BASE}/inventory`);
-  if (!res.ok) throw new Error("Failed to fetch inventory");
-  return res.json();
+  return fetchConditional<Ingredient[]>(`${API_BASE}/inventory`, "Failed to fetch inventory");
+}
+
+export interface InventorySnapshot {
+  ingredients: Ingredient[];
+  revenue_at_risk_per_hour: number;
+}
+
+export interface InventoryDelta {
+  changed: Ingredient[];
+  revenue_at_risk_per_hour: number;
+  revenue_at_risk_delta: number;
+}
+
+/**
+ * Subscribe to server-pushed inventory updates. The server sends one snapshot, then
+ * only the ingredients that changed. Returns a function that closes the stream.
+ */
+export function subscribeInventory(handlers: {
+  onSnapshot: (snapshot: InventorySnapshot) => void;
+  onDelta: (delta: InventoryDelta) => void;
+  onError?: () => void;
+}): () => void {
+  let source = new EventSource(`${API_BASE}/stream`);
+  const attach = (es: EventSource) => {
+    es.addEventListener("snapshot", (e) => handlers.onSnapshot(JSON.parse((e as MessageEvent).data)));
+    es.addEventListener("inventory_delta", (e) => handlers.onDelta(JSON.parse((e as MessageEvent).data)));
+    es.addEventListener("resync", () => {
+      // We fell behind; reconnecting delivers a fresh snapshot.
+      es.close();
+      source = new EventSource(`${API_BASE}/stream`);
+      attach(source);
+    });
+    es.onerror = () => handlers.onError?.();
+  };
+  attach(source);
+  return () => source.close();
 }
 
 export async function seedDatabase(): Promise<{ status: string; message: string }> {
@@ -32,7 +83,22 @@ export async function simulateRush(): Promise<{ status: string; message: string;
 export interface BlastRadiusNode {
   id: string;
   label: string;
-  type: "ingredient" | "sub_recipe" | "menu_item";
+  type: "ingredient" | "sub_recipe" | "menu_item" | "menu_group";
+  /** Collapsed menu items (menu_group nodes only). */
+  count?: number;
+  revenue_per_hour?: number;
+}
+
+export interface BlastRadiusPruning {
+  max_depth: number | null;
+  top_k: number | null;
+  group_by: string | null;
+  nodes_total: number;
+  edges_total: number;
+  nodes_shown: number;
+  edges_shown: number;
+  beyond_depth: number;
+  collapsed: number;
 }
 
 export interface BlastRadiusResponse {
@@ -43,12 +109,69 @@ export interface BlastRadiusResponse {
   affected_with_revenue: { menu_item: string; revenue_per_hour: number }[];
   total_menu_count: number;
   total_revenue_risk_per_hour: number;
+  pruned?: BlastRadiusPruning;
 }
 
-export async function fetchBlastRadius(ingredientName: string): Promise<BlastRadiusResponse> {
-  const res = await fetch(`${API_BASE}/blast-radius/${encodeURIComponent(ingredientName)}`);
-  if (!res.ok) throw new Error("Failed to fetch blast radius");
-  return res.json();
+/** `format=compact` payload: node columns plus a flat [from, to, ...] list of node indexes. */
+interface BlastRadiusCompact {
+  format: "compact";
+  ingredient: string;
+  types: BlastRadiusNode["type"][];
+  node_ids: string[];
+  node_types: number[];
+  edges: number[];
+  groups: { node: number; label: string; count: number; revenue_per_hour: number }[];
+  affected_menu_items: string[];
+  affected_with_revenue: { menu_item: string[]; revenue_per_hour: number[] };
+  total_menu_count: number;
+  total_revenue_risk_per_hour: number;
+  pruned?: BlastRadiusPruning;
+}
+
+function expandBlastRadius(c: BlastRadiusCompact): BlastRadiusResponse {
+  const nodes: BlastRadiusNode[] = c.node_ids.map((id, i) => ({ id, label: id, type: c.types[c.node_types[i]] }));
+  for (const g of c.groups) {
+    Object.assign(nodes[g.node], { label: g.label, count: g.count, revenue_per_hour: g.revenue_per_hour });
+  }
+  const edges: { from: string; to: string }[] = [];
+  for (let i = 0; i < c.edges.length; i += 2) {
+    edges.push({ from: c.node_ids[c.edges[i]], to: c.node_ids[c.edges[i + 1]] });
+  }
+  return {
+    ingredient: c.ingredient,
+    nodes,
+    edges,
+    affected_menu_items: c.affected_menu_items,
+    affected_with_revenue: c.affected_with_revenue.menu_item.map((menu_item, i) => ({
+      menu_item,
+      revenue_per_hour: c.affected_with_revenue.revenue_per_hour[i],
+    })),
+    total_menu_count: c.total_menu_count,
+    total_revenue_risk_per_hour: c.total_revenue_risk_per_hour,
+    pruned: c.pruned,
+  };
+}
+
+export interface BlastRadiusOptions {
+  maxDepth?: number;
+  /** Draw only the top K menu items by revenue; the rest are collapsed. */
+  topK?: number;
+  groupBy?: "category";
+}
+
+export async function fetchBlastRadius(
+  ingredientName: string,
+  options: BlastRadiusOptions = {}
+): Promise<BlastRadiusResponse> {
+  const params = new URLSearchParams({ format: "compact" });
+  if (options.maxDepth !== undefined) params.set("max_depth", String(options.maxDepth));
+  if (options.topK !== undefined) params.set("top_k", String(options.topK));
+  if (options.groupBy) params.set("group_by", options.groupBy);
+  const compact = await fetchConditional<BlastRadiusCompact>(
+    `${API_BASE}/blast-radius/${encodeURIComponent(ingredientName)}?${params}`,
+    "Failed to fetch blast radius"
+  );
+  return expandBlastRadius(compact);
 }
 
 export interface RestockResponse {